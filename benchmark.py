@@ -0,0 +1,238 @@
+"""Benchmarks for the sales data layer.
+
+Run with:  python benchmark.py cache --rows 1000000 10000000 50000000
+           python benchmark.py backends --rows 1000000
+           python benchmark.py engine --rows 1000000 10000000
+           python benchmark.py stream --rows 1000000 --budget-mb 16
+Fixtures:  python benchmark.py generate big.csv --rows 100000000
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import timeit
+from contextlib import closing
+from datetime import date
+
+import pandas as pd
+
+import sales_data
+import sales_engine
+import sales_sql
+
+# -----------------------
+# TIMING
+# -----------------------
+LOAD_SNIPPETS = {
+    "csv": "sales_data.read_sales_csv({path!r})",
+    "cache": "sales_data.load_sales_data({path!r})"
+}
+
+def time_fresh_process(kind, path):
+    """Time one load in a fresh interpreter so nothing is warm in-process"""
+    code = (
+        "import time, sales_data; t0 = time.perf_counter(); "
+        + LOAD_SNIPPETS[kind].format(path=path)
+        + "; print(time.perf_counter() - t0)"
+    )
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True, capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def bench_cache(rows_list):
+    """Compare CSV parsing against the columnar cache and a generated columnar dataset at several sizes"""
+    print(f"{'rows':>12} {'csv MB':>8} {'csv parse':>10} {'cache build':>12} {'cache load':>11} {'speedup':>8} {'columnar':>9}")
+    for rows in rows_list:
+        workdir = tempfile.mkdtemp(prefix="salesbench_")
+        try:
+            path = os.path.join(workdir, "salesdata.csv")
+            sales_data.generate_sales_data(path, rows, n_products=200, n_sales_reps=40)
+            size_mb = os.path.getsize(path) / 1e6
+
+            csv_time = time_fresh_process("csv", path)
+            build_time = time_fresh_process("cache", path)
+            load_time = time_fresh_process("cache", path)
+            # The same rows written straight to a columnar dataset, never parsed
+            store_path = os.path.join(workdir, "salesdata")
+            sales_data.generate_sales_data(store_path, rows, fmt="columnar", n_products=200, n_sales_reps=40)
+            columnar_time = time_fresh_process("cache", store_path)
+            print(
+                f"{rows:>12,} {size_mb:>8.0f} {csv_time:>9.2f}s {build_time:>11.2f}s {load_time:>10.2f}s "
+                f"{csv_time / load_time:>7.1f}x {columnar_time:>8.2f}s"
+            )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print("Note: the OS page cache is not dropped between runs, so file reads may be warm.")
+
+def _measure(fn):
+    """Run fn once, returning (seconds, peak traced MB)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return elapsed, peak
+
+def bench_backends(rows_list):
+    """Filter + aggregate latency of the pandas path against pushed-down SQLite"""
+    filters = {
+        "regions": ["North", "East"],
+        "categories": ["Electronics", "Sports"],
+        "products": None,
+        "start_date": date(2024, 3, 1),
+        "end_date": date(2024, 8, 31)
+    }
+    print(f"{'rows':>12} {'pandas':>9} {'pandas MB':>10} {'sqlite':>9} {'sqlite MB':>10}")
+    for rows in rows_list:
+        workdir = tempfile.mkdtemp(prefix="salesbench_")
+        try:
+            path = os.path.join(workdir, "salesdata.csv")
+            sales_data.generate_sales_data(path, rows)
+            df = sales_data.load_sales_data(path)
+            db_path = sales_sql.ensure_sales_db(path)
+
+            pandas_time, pandas_mb = _measure(
+                lambda: sales_engine.compute_aggregates(sales_engine.apply_filters(df, filters))
+            )
+
+            def run_sql():
+                with closing(sales_sql.connect(db_path)) as conn:
+                    sales_engine.finalize_aggregates(sales_sql.query_partials(conn, filters))
+            sql_time, sql_mb = _measure(run_sql)
+            print(f"{rows:>12,} {pandas_time:>8.3f}s {pandas_mb:>10.1f} {sql_time:>8.3f}s {sql_mb:>10.1f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print("Note: MB is peak Python-heap allocation during the query (tracemalloc).")
+
+def groupby_partials(df):
+    """The per-chart groupby sequence the dashboard ran before the single-pass engine"""
+    def sum_by(values, keys):
+        totals = values.groupby(keys, observed=True).sum()
+        totals.index = totals.index.astype(str)
+        return totals
+    weekday = df["Date"].dt.dayofweek
+    return {
+        "rows": len(df),
+        "total_revenue": df["Revenue"].sum(),
+        "total_quantity": df["Quantity"].sum(),
+        "min_date": df["Date"].min() if len(df) else None,
+        "max_date": df["Date"].max() if len(df) else None,
+        "product_revenue": sum_by(df["Revenue"], df["Product"]),
+        "day_revenue": df["Revenue"].groupby(df["Date"].dt.floor("D")).sum(),
+        "category_revenue": sum_by(df["Revenue"], df["Category"]),
+        "region_revenue": sum_by(df["Revenue"], df["Region"]),
+        "region_quantity": sum_by(df["Quantity"], df["Region"]),
+        "weekday_revenue": df["Revenue"].groupby(weekday).sum(),
+        "weekday_count": df["Revenue"].groupby(weekday).count()
+    }
+
+def _check_same(expected, actual):
+    """Fail loudly if the single-pass engine disagrees with the groupby reference"""
+    for key, value in expected.items():
+        if isinstance(value, pd.Series):
+            pd.testing.assert_series_equal(
+                value.sort_index(), actual[key].sort_index(),
+                check_dtype=False, check_names=False, check_index_type=False, rtol=1e-9
+            )
+        elif isinstance(value, pd.Timestamp) or value is None:
+            assert value == actual[key], key
+        else:
+            assert abs(value - actual[key]) <= 1e-9 * max(1, abs(value)), key
+
+def bench_engine(rows_list, repeat=3):
+    """Single-pass bincount engine against the groupby sequence, on raw rows and on the cube"""
+    print(f"{'rows':>12} {'input':>6} {'groupby':>9} {'one pass':>9} {'speedup':>8}")
+    for rows in rows_list:
+        workdir = tempfile.mkdtemp(prefix="salesbench_")
+        try:
+            path = os.path.join(workdir, "salesdata.csv")
+            sales_data.generate_sales_data(path, rows)
+            df = sales_data.load_sales_data(path)
+            for label, frame in (("rows", df), ("cube", sales_engine.build_cube(df))):
+                if label == "rows":
+                    _check_same(groupby_partials(frame), sales_engine.partial_aggregates(frame))
+                old = min(timeit.repeat(lambda: groupby_partials(frame), number=1, repeat=repeat))
+                new = min(timeit.repeat(lambda: sales_engine.partial_aggregates(frame), number=1, repeat=repeat))
+                print(f"{rows:>12,} {label:>6} {old:>8.3f}s {new:>8.3f}s {old / new:>7.1f}x")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print("Note: the groupby reference cannot weight cube cells, so only its timing is shown for the cube.")
+
+def bench_stream(rows_list, budget_mb):
+    """Bounded-memory streaming against an in-memory load of the same file, checked equal"""
+    print(f"{'rows':>12} {'chunk rows':>11} {'in-memory':>10} {'streamed':>9} {'duplicates':>11}")
+    for rows in rows_list:
+        workdir = tempfile.mkdtemp(prefix="salesbench_")
+        try:
+            path = os.path.join(workdir, "salesdata.csv")
+            sales_data.generate_sales_data(path, rows)
+            start = time.perf_counter()
+            frame = sales_data.read_sales_csv(path)
+            expected = sales_engine.partial_aggregates(frame)
+            in_memory = time.perf_counter() - start
+            start = time.perf_counter()
+            actual = sales_engine.stream_partials(path, memory_budget_mb=budget_mb)
+            streamed = time.perf_counter() - start
+            # Duplicates that straddle chunks must be dropped exactly as a whole-file load drops them
+            _check_same(expected, actual)
+            chunk_rows = sales_engine.chunk_rows_for_budget(path, budget_mb)
+            duplicates = frame.attrs["cleaning"]["duplicates_dropped"]
+            print(f"{rows:>12,} {chunk_rows:>11,} {in_memory:>9.3f}s {streamed:>8.3f}s {duplicates:>11,}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cache = sub.add_parser("cache", help="cold load: CSV parse vs columnar cache")
+    cache.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+
+    backends = sub.add_parser("backends", help="pandas vs SQLite filter + aggregate latency")
+    backends.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+
+    engine = sub.add_parser("engine", help="single-pass aggregation vs the groupby sequence")
+    engine.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+
+    stream = sub.add_parser("stream", help="bounded-memory streaming vs an in-memory load, checked equal")
+    stream.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    stream.add_argument("--budget-mb", type=int, default=16)
+
+    generate = sub.add_parser("generate", help="write a seeded synthetic dataset")
+    generate.add_argument("path")
+    generate.add_argument("--rows", type=int, default=1_000_000)
+    generate.add_argument("--format", choices=["csv", "columnar"], default="csv")
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--regions", type=int, default=5)
+    generate.add_argument("--products", type=int, default=25)
+    generate.add_argument("--sales-reps", type=int, default=6)
+    generate.add_argument("--start-date", default="2023-01-01")
+    generate.add_argument("--end-date", default="2024-12-31")
+    generate.add_argument("--chunk-rows", type=int, default=1_000_000)
+
+    args = parser.parse_args()
+    if args.command == "cache":
+        bench_cache(args.rows)
+    elif args.command == "backends":
+        bench_backends(args.rows)
+    elif args.command == "engine":
+        bench_engine(args.rows)
+    elif args.command == "stream":
+        bench_stream(args.rows, args.budget_mb)
+    elif args.command == "generate":
+        sales_data.generate_sales_data(
+            args.path, args.rows, fmt=args.format, seed=args.seed,
+            n_regions=args.regions, n_products=args.products, n_sales_reps=args.sales_reps,
+            start_date=args.start_date, end_date=args.end_date, chunk_rows=args.chunk_rows
+        )
+
+if __name__ == "__main__":
+    main()
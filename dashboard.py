@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import json
 import os
@@ -10,8 +11,16 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
+from contextlib import closing
 import time
 
+import sales_data
+import sales_engine
+import sales_search
+import sales_sql
+import sales_table
+import sales_topk
+
 # -----------------------
 # CONFIG
 # -----------------------
@@ -20,6 +29,19 @@ st.set_page_config(page_title="Sales Dashboard", page_icon="📊", layout="wide"
 USERS_FILE = "users.json"
 OTP_FILE = "otp_data.json"
 
+# Rows parsed twice (default dtypes and typed schema) for the admin memory report
+SCHEMA_REPORT_ROWS = 1_000_000
+
+# "pandas" filters and aggregates the in-memory frame; "sqlite" pushes the
+# sidebar filters and every chart aggregation down into an indexed SQLite copy
+QUERY_BACKEND = os.getenv("SALES_BACKEND", "pandas")
+
+# Size and seed of the demo dataset written when salesdata.csv is missing
+SAMPLE_DATA_ROWS = 4_000
+SAMPLE_DATA_SEED = 42
+
+TREND_TITLES = {"day": "Daily", "week": "Weekly", "month": "Monthly", "quarter": "Quarterly"}
+
 # Email configuration - Set these in your environment or here
 EMAIL_CONFIG = {
     "smtp_server": "smtp.gmail.com",  # For Gmail
@@ -700,6 +722,11 @@ def get_user_by_username(username):
         return username, users[username]
     return None, None
 
+def is_admin(username):
+    """Check whether a user has the admin role"""
+    _, user_data = get_user_by_username(username)
+    return bool(user_data) and user_data.get("role") == "admin"
+
 def update_last_login(username):
     """Update user's last login time"""
     users = load_users()
@@ -1002,47 +1029,51 @@ def show_login():
 # -----------------------
 # DASHBOARD FUNCTIONS
 # -----------------------
+# One ingest state per server process, shared by every session. Appends are
+# parsed incrementally; a rewritten file triggers a full reload from the shared
+# memory-mapped store. Every rebuild is published as a complete snapshot
+@st.cache_resource
+def get_ingest_state():
+    return sales_data.new_ingest_state(derive=sales_engine.derive_snapshot)
+
+# Files too large for memory and partitioned directories are pre-warmed too:
+# the watcher streams the first's default view and snapshots the second's
+@st.cache_resource
+def get_stream_state():
+    return sales_engine.new_stream_state()
+
+@st.cache_resource
+def get_partition_state():
+    return sales_data.new_partition_state(derive=sales_engine.derive_snapshot)
+
+# One watcher thread per server process rebuilds whatever the current backend
+# reads as soon as the source changes, so reruns find it already warm
+@st.cache_resource
+def start_sales_watcher(source, backend):
+    if sales_data.WATCH_INTERVAL_SECONDS <= 0:
+        return None
+    columnar = sales_data.is_columnar_dataset(source)
+    if sales_data.is_partitioned(source):
+        partition_state = get_partition_state()
+        refresh = lambda: sales_data.prewarm_partition_snapshot(source, partition_state)
+    elif backend == "sqlite" and not columnar:
+        refresh = lambda: sales_sql.ensure_sales_db(source)
+    else:
+        state = get_ingest_state()
+        stream_state = get_stream_state()
+        def refresh():
+            # A columnar dataset is mapped, not parsed, so it needs no budget check
+            if columnar or sales_engine.fits_in_memory(source):
+                sales_data.ingest_sales_data(source, state)
+            else:
+                sales_engine.prewarm_stream_partials(source, stream_state, sales_data.source_signature(source))
+    return sales_data.watch_sales_source(source, refresh)
+
 def create_sample_data():
     """Create sample sales data if CSV doesn't exist"""
-    if not os.path.exists("salesdata.csv"):
+    if not os.path.exists(sales_data.SALES_FILE):
         st.info("Creating sample sales data...")
-        
-        dates = pd.date_range(start='2023-01-01', end='2024-12-31', freq='D')
-        regions = ['North', 'South', 'East', 'West', 'Central']
-        categories = ['Electronics', 'Clothing', 'Home & Garden', 'Sports', 'Books', 'Beauty', 'Automotive']
-        products = [
-            'Smartphone Pro', 'Laptop Ultra', 'Wireless Headphones', 'Smart Watch', 'Tablet',
-            'Designer Jeans', 'Cotton T-Shirt', 'Winter Jacket', 'Running Shoes', 'Formal Shirt',
-            'Garden Tools Set', 'Plant Pots', 'Outdoor Furniture', 'BBQ Grill', 'Lawn Mower',
-            'Football', 'Tennis Racket', 'Yoga Mat', 'Dumbbells', 'Bicycle',
-            'Programming Book', 'Novel', 'Cookbook', 'Travel Guide', 'Children Book'
-        ]
-        
-        data = []
-        for date in dates:
-            daily_sales = random.randint(1, 10)
-            for _ in range(daily_sales):
-                product = random.choice(products)
-                category = 'Electronics' if product in products[:5] else \
-                          'Clothing' if product in products[5:10] else \
-                          'Home & Garden' if product in products[10:15] else \
-                          'Sports' if product in products[15:20] else 'Books'
-                
-                quantity = random.randint(1, 50)
-                base_price = random.uniform(50, 2000)
-                revenue = round(base_price * quantity, 2)
-                
-                data.append({
-                    'Date': date,
-                    'Region': random.choice(regions),
-                    'Category': category,
-                    'Product': product,
-                    'Quantity': quantity,
-                    'Revenue': revenue
-                })
-        
-        df = pd.DataFrame(data)
-        df.to_csv("salesdata.csv", index=False)
+        sales_data.generate_sales_data(sales_data.SALES_FILE, rows=SAMPLE_DATA_ROWS, seed=SAMPLE_DATA_SEED)
         st.success("✅ Sample data created successfully!")
 
 def show_dashboard():
@@ -1084,33 +1115,106 @@ def show_dashboard():
             st.session_state.page = "register"
             trigger_rerun()
 
-    create_sample_data()
+    source = sales_data.SALES_SOURCE
+    partitioned = sales_data.is_partitioned(source)
+    # A columnar dataset from benchmark.py generate is mapped as it is; it has
+    # no CSV for the SQLite backend, the memory report or the streaming engine
+    columnar = sales_data.is_columnar_dataset(source)
+    if not partitioned and not columnar:
+        create_sample_data()
     
+    # Only the partitions overlapping the date range are loaded, cubed and
+    # indexed; the key holds their signatures so a rewritten partition is reloaded
+    @st.cache_resource(max_entries=4)
+    def load_partition_snapshot(rel_paths, signatures):
+        return sales_data.partition_snapshot(source, rel_paths, sales_engine.derive_snapshot)
+
+    # Files too large for memory are aggregated chunk by chunk instead of loaded;
+    # these helpers are keyed on the file signature so a changed file is re-read
     @st.cache_data
-    def load_sales_data():
-        try:
-            return pd.read_csv("salesdata.csv", parse_dates=["Date"])
-        except:
-            return pd.read_csv("salesdata.csv", parse_dates=["Date"])
+    def sales_file_fits_in_memory(path, signature):
+        return sales_engine.fits_in_memory(path)
+
+    @st.cache_data
+    def schema_memory_report(path, signature):
+        return sales_data.schema_memory_report(path, nrows=SCHEMA_REPORT_ROWS)
+
+    @st.cache_data
+    def stream_sales_partials(path, signature, filters):
+        return sales_engine.stream_partials(path, filters)
+
+    def streamed_partials(filters):
+        # The watcher streams the whole file and the default view ahead of reruns
+        partials = sales_engine.prewarmed_stream_partials(get_stream_state(), signature, filters)
+        return stream_sales_partials(source, signature, filters) if partials is None else partials
+
+    @st.cache_data
+    def sql_sales_summary(db_path, signature):
+        with closing(sales_sql.connect(db_path)) as conn:
+            return sales_sql.query_partials(conn)
+
+    # Approximate mode samples each dataset once and reuses the sample for
+    # every selection; the frame itself is not hashed
+    @st.cache_resource(max_entries=2)
+    def snapshot_sample(snapshot_id, _frame):
+        return sales_engine.build_stratified_sample(_frame, len(_frame))
+
+    @st.cache_resource(max_entries=2)
+    def stream_sample(path, signature):
+        return sales_engine.stream_stratified_sample(path)
 
     try:
-        df = load_sales_data()
-    except:
-        try:
-            @st.cache
-            def load_data_old():
-                return pd.read_csv("salesdata.csv", parse_dates=["Date"])
-            df = load_data_old()
-        except Exception as e:
-            st.error(f"❌ Error loading sales data: {e}")
-            st.info("Please ensure 'salesdata.csv' exists in the same directory as this script.")
-            return
+        df = None
+        snapshot = None
+        cleaning_report = None
+        streaming = False
+        use_sqlite = QUERY_BACKEND == "sqlite" and not partitioned and not columnar
+        if partitioned:
+            partition_index = sales_data.refresh_partition_index(source)
+            min_date, max_date = sales_data.partition_date_bounds(partition_index)
+            if min_date is None:
+                raise ValueError(f"no sales rows found under '{source}'")
+            grand_total_revenue = sum(e["revenue"] for e in partition_index["partitions"].values())
+        else:
+            signature = sales_data.source_signature(source)
+        if use_sqlite:
+            # SQLite works out of core, so no memory-budget check is needed
+            db_path = sales_sql.ensure_sales_db(source)
+            summary = sql_sales_summary(db_path, signature)
+            product_ranking = sales_topk.new_ranking(summary["product_revenue"])
+            grand_total_revenue = summary["total_revenue"]
+            min_date = summary["min_date"].date()
+            max_date = summary["max_date"].date()
+        elif not partitioned and not columnar:
+            streaming = not sales_file_fits_in_memory(source, signature)
+        if streaming:
+            summary = streamed_partials(None)
+            product_ranking = sales_topk.new_ranking(summary["product_revenue"])
+            grand_total_revenue = summary["total_revenue"]
+            min_date = summary["min_date"].date()
+            max_date = summary["max_date"].date()
+        elif not partitioned and not use_sqlite:
+            ingest_state = get_ingest_state()
+            snapshot = ingest_state["snapshot"]
+            if snapshot is None or start_sales_watcher(source, QUERY_BACKEND) is None:
+                # Nothing published yet, or no watcher: build on this rerun
+                snapshot = sales_data.ingest_sales_data(source, ingest_state)["snapshot"]
+            df = snapshot["frame"]
+            product_ranking = snapshot["product_ranking"]
+            cleaning_report = snapshot["cleaning"]
+            grand_total_revenue = snapshot["grand_total_revenue"]
+            min_date = snapshot["min_date"]
+            max_date = snapshot["max_date"]
+    except Exception as e:
+        st.error(f"❌ Error loading sales data: {e}")
+        st.info(f"Please ensure '{source}' exists in the same directory as this script.")
+        return
 
     with st.sidebar:
         st.markdown("## 🔍 Data Filters")
         
-        min_date = df["Date"].min().date()
-        max_date = df["Date"].max().date()
+        if streaming:
+            st.info("🗄️ Large file: charts are computed by streaming it in chunks.")
         
         try:
             date_range = st.date_input(
@@ -1129,91 +1233,207 @@ def show_dashboard():
         else:
             start_date = end_date = date_range[0]
         
+        granularity_choice = st.selectbox("📈 Trend Granularity:", ["Auto", "Day", "Week", "Month", "Quarter"])
+        if granularity_choice == "Auto":
+            granularity = sales_engine.choose_granularity(start_date, end_date)
+        else:
+            granularity = granularity_choice.lower()
+        
+        if partitioned:
+            selected_partitions = tuple(sales_data.select_partitions(partition_index, start_date, end_date))
+            st.caption(f"🗂️ Reading {len(selected_partitions)} of {len(partition_index['partitions'])} partitions")
+            if not selected_partitions:
+                st.warning("⚠️ No partitions cover the selected dates.")
+                return
+            signatures = sales_data.partition_signatures(partition_index, selected_partitions)
+            snapshot = sales_data.prewarmed_partition_snapshot(get_partition_state(), selected_partitions, signatures)
+            if snapshot is None:
+                snapshot = load_partition_snapshot(selected_partitions, signatures)
+            df = snapshot["frame"]
+            product_ranking = snapshot["product_ranking"]
+            report_path = os.path.join(source, selected_partitions[0])
+        else:
+            report_path = None if columnar else source
+        
+        if streaming or use_sqlite:
+            region_options = sorted(summary["region_revenue"].index)
+            category_options = sorted(summary["category_revenue"].index)
+        elif snapshot is not None:
+            region_options = snapshot["default_filters"]["regions"]
+            category_options = snapshot["default_filters"]["categories"]
+        else:
+            region_options = sorted(df["Region"].unique())
+            category_options = sorted(df["Category"].unique())
+        
         region_filter = st.multiselect(
             "🌍 Regions:",
-            options=sorted(df["Region"].unique()),
-            default=sorted(df["Region"].unique())
+            options=region_options,
+            default=region_options
         )
         
         category_filter = st.multiselect(
             "📂 Categories:",
-            options=sorted(df["Category"].unique()),
-            default=sorted(df["Category"].unique())
+            options=category_options,
+            default=category_options
         )
         
-        top_products = df.groupby("Product")["Revenue"].sum().sort_values(ascending=False).head(20).index.tolist()
+        top_products = sales_topk.top_keys(product_ranking, sales_engine.TOP_PRODUCT_OPTIONS)
         product_filter = st.multiselect(
             "🏷️ Products (Top 20):",
             options=top_products,
             default=top_products
         )
+        if sales_topk.is_sketch(product_ranking):
+            st.caption("🏷️ Too many products to rank exactly; the top 20 are estimated.")
+
+        # SQLite answers in the database, so there is no sample to estimate from
+        approximate = not use_sqlite and st.toggle(
+            "⚡ Approximate mode",
+            help="Estimate KPIs and charts from a sample stratified by region and category, with 95% confidence intervals"
+        )
 
-    df_filtered = df[
-        (df["Region"].isin(region_filter)) &
-        (df["Category"].isin(category_filter)) &
-        (df["Product"].isin(product_filter)) &
-        (df["Date"].dt.date >= start_date) &
-        (df["Date"].dt.date <= end_date)
-    ]
+        if is_admin(st.session_state.username):
+            st.markdown("---")
+            st.markdown("## 🛠️ Admin")
+            if report_path is not None:
+                with st.expander("🧮 Memory Report"):
+                    st.caption(f"Default dtypes vs the typed schema, over the first {SCHEMA_REPORT_ROWS:,} rows.")
+                    if st.button("Build report", use_container_width=True):
+                        report = schema_memory_report(report_path, sales_data.file_signature(report_path))
+                        st.dataframe(report, use_container_width=True, hide_index=True)
+            with st.expander("🗃️ Result Cache"):
+                stats = sales_engine.result_cache_stats()
+                st.caption(f"KPIs and charts shared across sessions; {stats['mb']:.1f} of {stats['budget_mb']:.0f} MB used.")
+                st.dataframe(pd.DataFrame([
+                    ("Entries", f"{stats['entries']:,}"),
+                    ("Hits", f"{stats['hits']:,}"),
+                    ("Misses", f"{stats['misses']:,}"),
+                    ("Hit rate", f"{stats['hit_rate']:.0%}"),
+                    ("Evictions", f"{stats['evictions']:,}")
+                ], columns=["Metric", "Value"]), use_container_width=True, hide_index=True)
+            if cleaning_report:
+                with st.expander("🧹 Cleaning Report"):
+                    st.caption("Applied once at ingest; dashboard rows are already clean.")
+                    rows = [(k.replace("_", " ").capitalize(), v) for k, v in cleaning_report.items() if k != "coerced"]
+                    rows += [(f"Coerced to NaN: {name}", n) for name, n in cleaning_report["coerced"].items()]
+                    st.dataframe(pd.DataFrame(rows, columns=["Step", "Rows"]), use_container_width=True, hide_index=True)
+
+    filters = {
+        "regions": region_filter,
+        "categories": category_filter,
+        "products": product_filter,
+        "start_date": start_date,
+        "end_date": end_date,
+        "granularity": granularity
+    }
+    aggregates = None
+    estimates = None
+    if approximate:
+        sample = stream_sample(source, signature) if streaming else snapshot_sample(snapshot["id"], df)
+        estimates = sales_engine.progressive_aggregates(sample, filters)
+        # Selections too narrow to turn up in the sample are answered exactly
+        aggregates = next(estimates, None)
+        if aggregates is None:
+            estimates = None
+    if aggregates is None:
+        if streaming:
+            # Partials hold per-day sums, so a new granularity needs no new pass
+            row_filters = {key: value for key, value in filters.items() if key != "granularity"}
+            aggregates = sales_engine.finalize_aggregates(streamed_partials(row_filters), granularity)
+        elif use_sqlite:
+            with closing(sales_sql.connect(db_path)) as conn:
+                # Ordered by mtime, so a rewritten file's results replace the old ones
+                aggregates = sales_engine.cached_aggregates(
+                    (signature[1], signature[0]), filters,
+                    lambda: sales_engine.finalize_aggregates(sales_sql.query_partials(conn, filters), granularity),
+                    source=("sqlite", db_path)
+                )
+        else:
+            # KPI cards come from the snapshot's prefix sums; the charts are
+            # aggregated from its cube only after the cards have been sent
+            kpis = sales_engine.snapshot_kpis(snapshot, filters, st.session_state)
+    if aggregates is not None:
+        kpis = {key: aggregates[key] for key in sales_engine.KPI_KEYS}
 
     st.markdown('<div class="title-container"><h1>📊 Sales Analytics Dashboard</h1></div>', unsafe_allow_html=True)
     st.markdown(f"## Welcome back, **{st.session_state.username}**! 👋")
     
-    if df_filtered.empty:
+    if kpis["total_orders"] == 0:
         st.warning("⚠️ No data available for the selected filters. Please adjust your filter criteria.")
         return
 
     st.markdown("## 📈 Key Performance Indicators")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    total_revenue = df_filtered['Revenue'].sum()
-    total_quantity = df_filtered['Quantity'].sum()
-    avg_order_value = df_filtered['Revenue'].mean()
-    total_orders = len(df_filtered)
-    
-    with col1:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h4>💰 Total Revenue</h4>
-                <h2>₹{total_revenue:,.2f}</h2>
-                <p>{((total_revenue / df['Revenue'].sum()) * 100):.1f}% of total</p>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h4>📦 Total Quantity</h4>
-                <h2>{total_quantity:,}</h2>
-                <p>Units sold</p>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h4>🏷️ Avg Order Value</h4>
-                <h2>₹{avg_order_value:,.2f}</h2>
-                <p>Per transaction</p>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h4>📋 Total Orders</h4>
-                <h2>{total_orders:,}</h2>
-                <p>Transactions</p>
-            </div>
-        """, unsafe_allow_html=True)
+
+    def render_kpi_cards(kpis, margins=None):
+        col1, col2, col3, col4 = st.columns(4)
+        
+        total_revenue = kpis["total_revenue"]
+        total_quantity = kpis["total_quantity"]
+        avg_order_value = kpis["avg_order_value"]
+        total_orders = kpis["total_orders"]
+
+        # Approximate figures carry their 95% confidence interval
+        def interval(key, fmt):
+            return f"<p>± {fmt.format(margins[key])} (95% CI)</p>" if margins else ""
+        
+        with col1:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <h4>💰 Total Revenue</h4>
+                    <h2>₹{total_revenue:,.2f}</h2>{interval("total_revenue", "₹{:,.2f}")}
+                    <p>{((total_revenue / grand_total_revenue) * 100):.1f}% of total</p>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <h4>📦 Total Quantity</h4>
+                    <h2>{total_quantity:,}</h2>{interval("total_quantity", "{:,.0f}")}
+                    <p>Units sold</p>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <h4>🏷️ Avg Order Value</h4>
+                    <h2>₹{avg_order_value:,.2f}</h2>{interval("avg_order_value", "₹{:,.2f}")}
+                    <p>Per transaction</p>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col4:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <h4>📋 Total Orders</h4>
+                    <h2>{total_orders:,}</h2>{interval("total_orders", "{:,.0f}")}
+                    <p>Transactions</p>
+                </div>
+            """, unsafe_allow_html=True)
+
+    kpi_slot = st.empty()
+    with kpi_slot.container():
+        render_kpi_cards(kpis, aggregates.get("margins") if aggregates else None)
+    if estimates is not None:
+        # Refine in place over larger samples while the time budget lasts
+        for aggregates in estimates:
+            with kpi_slot.container():
+                render_kpi_cards(aggregates, aggregates["margins"])
+        st.caption(
+            f"⚡ Estimated from {aggregates['sampled_rows']:,} of {aggregates['population_rows']:,} rows "
+            "with 95% confidence intervals. Switch off approximate mode for exact figures."
+        )
 
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
+    if aggregates is None:
+        aggregates = sales_engine.snapshot_aggregates(snapshot, filters, st.session_state)
+
     st.markdown("## 📊 Sales Analytics")
     
     st.markdown("### 🏆 Top 10 Products by Revenue")
-    top_products_data = df_filtered.groupby("Product")["Revenue"].sum().sort_values(ascending=False).head(10).reset_index()
+    top_products_data = aggregates["top_products"]
     
     if not top_products_data.empty:
         fig1 = px.bar(
@@ -1223,6 +1443,7 @@ def show_dashboard():
             orientation='h',
             color="Revenue",
             color_continuous_scale="viridis",
+            error_x="Revenue_CI" if "Revenue_CI" in top_products_data else None,
             title="Top Performing Products"
         )
         fig1.update_layout(
@@ -1236,16 +1457,16 @@ def show_dashboard():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("### 📈 Monthly Revenue Trend")
-        monthly_data = df_filtered.groupby(df_filtered["Date"].dt.to_period("M"))["Revenue"].sum().reset_index()
-        monthly_data["Date"] = monthly_data["Date"].astype(str)
+        st.markdown(f"### 📈 {TREND_TITLES[granularity]} Revenue Trend")
+        trend_data = aggregates["trend"]
         
-        if not monthly_data.empty:
+        if not trend_data.empty:
             fig2 = px.line(
-                monthly_data,
+                trend_data,
                 x="Date",
                 y="Revenue",
                 markers=True,
+                error_y="Revenue_CI" if "Revenue_CI" in trend_data else None,
                 title="Revenue Over Time"
             )
             fig2.update_traces(line=dict(color='#3b82f6', width=3))
@@ -1254,7 +1475,7 @@ def show_dashboard():
     
     with col2:
         st.markdown("### 📊 Revenue by Category")
-        category_data = df_filtered.groupby("Category")["Revenue"].sum().reset_index()
+        category_data = aggregates["category"]
         
         if not category_data.empty:
             fig3 = px.pie(
@@ -1271,7 +1492,7 @@ def show_dashboard():
     
     with col1:
         st.markdown("### 🌍 Revenue by Region")
-        region_data = df_filtered.groupby("Region")["Revenue"].sum().reset_index().sort_values("Revenue", ascending=True)
+        region_data = aggregates["region"]
         
         if not region_data.empty:
             fig4 = px.bar(
@@ -1281,6 +1502,7 @@ def show_dashboard():
                 orientation='h',
                 color="Revenue",
                 color_continuous_scale="plasma",
+                error_x="Revenue_CI" if "Revenue_CI" in region_data else None,
                 title="Regional Performance"
             )
             fig4.update_layout(height=350)
@@ -1288,7 +1510,7 @@ def show_dashboard():
     
     with col2:
         st.markdown("### 📊 Quantity by Region")
-        region_qty_data = df_filtered.groupby("Region")["Quantity"].sum().reset_index()
+        region_qty_data = aggregates["region_quantity"]
         
         if not region_qty_data.empty:
             fig5 = px.pie(
@@ -1303,11 +1525,7 @@ def show_dashboard():
 
     st.markdown("### 📈 Sales Performance Analysis")
     
-    weekly_data = df_filtered.groupby(df_filtered["Date"].dt.dayofweek)["Revenue"].mean().reset_index()
-    weekly_data["Day"] = weekly_data["Date"].map({
-        0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday",
-        4: "Friday", 5: "Saturday", 6: "Sunday"
-    })
+    weekly_data = aggregates["weekday"]
     
     if not weekly_data.empty:
         fig6 = px.bar(
@@ -1324,41 +1542,82 @@ def show_dashboard():
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
     st.markdown("## 📄 Detailed Sales Data")
     
-    search_term = st.text_input("🔍 Search in data:", placeholder="Search by product, region, category...")
-    
-    if search_term:
-        mask = df_filtered.astype(str).apply(
-            lambda x: x.str.contains(search_term, case=False, na=False)
-        ).any(axis=1)
-        display_df = df_filtered[mask]
+    if streaming:
+        st.info("📄 Row-level data is not loaded for files larger than the memory budget. Raise SALES_MEMORY_BUDGET_MB to browse individual rows.")
+        return
+
+    # Rows are tracked as ids into the snapshot frame (or the fetched SQLite
+    # rows); only the page on screen is ever materialized
+    if use_sqlite:
+        with closing(sales_sql.connect(db_path)) as conn:
+            table = sales_sql.query_rows(conn, filters)
+        filtered_rows = np.arange(len(table))
     else:
-        display_df = df_filtered
+        table = snapshot["frame"]
+        filtered_rows = sales_engine.snapshot_row_ids(snapshot, filters)
+
+    search_term = st.text_input(
+        "🔍 Search in data:",
+        placeholder='e.g. phone  region:North  product:"Smartphone Pro"  revenue>50000  date:2024-09',
+        help="Words match any column. Narrow by field with field:text (contains), field=value (equals) "
+             "or >, >=, <, <= on Quantity, Unit_Price, Revenue and Date. All terms must match."
+    )
+    
+    try:
+        if search_term and snapshot is not None:
+            result_rows = sales_engine.snapshot_search_ids(snapshot, filters, search_term)
+        elif search_term:
+            result_rows = np.flatnonzero(sales_search.query_mask(table, search_term))
+        else:
+            result_rows = filtered_rows
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        result_rows = filtered_rows[:0]
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("📊 Showing Records", f"{len(display_df):,}")
+        st.metric("📊 Showing Records", f"{len(result_rows):,}")
     with col2:
-        st.metric("📈 Total Records", f"{len(df_filtered):,}")
+        st.metric("📈 Total Records", f"{len(filtered_rows):,}")
     with col3:
-        if len(df_filtered) > 0:
-            st.metric("📋 Filter Match", f"{(len(display_df)/len(df_filtered)*100):.1f}%")
+        if len(filtered_rows) > 0:
+            st.metric("📋 Filter Match", f"{(len(result_rows)/len(filtered_rows)*100):.1f}%")
 
-    if len(display_df) > 100:
-        st.info(f"📄 Showing first 100 rows of {len(display_df):,} records. Use search to filter data.")
-        display_df = display_df.head(100)
-    
-    display_df_formatted = display_df.copy()
-    display_df_formatted["Revenue"] = display_df_formatted["Revenue"].apply(lambda x: f"₹{x:,.2f}")
-    display_df_formatted["Date"] = display_df_formatted["Date"].dt.strftime("%Y-%m-%d")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_column = st.selectbox("↕️ Sort by:", list(table.columns))
+    with col2:
+        descending = st.radio("Order:", ["Ascending", "Descending"], horizontal=True) == "Descending"
+    with col3:
+        page_size = st.selectbox(
+            "Rows per page:", sales_table.PAGE_SIZES,
+            index=sales_table.PAGE_SIZES.index(sales_table.DEFAULT_PAGE_SIZE)
+        )
+    n_pages = sales_table.page_count(len(result_rows), page_size)
+    with col4:
+        page = min(int(st.number_input("Page:", min_value=1, value=1, step=1)), n_pages)
+
+    # Snapshot sort orders and formatted pages are built once and shared;
+    # fetched SQLite rows change every rerun
+    table_cache = None if use_sqlite else snapshot["table_cache"]
+    order = sales_table.sort_order(table, sort_column, descending, table_cache)
+    display_df = sales_table.formatted_page(
+        table, sales_table.page_rows(order, result_rows, len(table), page, page_size), table_cache
+    )
+    first_row = (page - 1) * page_size
+    st.caption(
+        f"Rows {min(first_row + 1, len(result_rows)):,}–{first_row + len(display_df):,} of {len(result_rows):,} "
+        f"· page {page:,} of {n_pages:,}"
+    )
     
     st.dataframe(
-        display_df_formatted,
+        display_df,
         use_container_width=True,
         height=400
     )
     
     if st.button("📥 Download Filtered Data as CSV"):
-        csv = display_df.to_csv(index=False)
+        csv = table.take(sales_table.ordered_rows(order, result_rows, len(table))).to_csv(index=False)
         st.download_button(
             label="💾 Click to Download CSV",
             data=csv,
@@ -1371,6 +1630,8 @@ def show_dashboard():
 # -----------------------
 def main():
     apply_theme(st.session_state.theme)
+    # Start warming the data while the visitor is still on the login page
+    start_sales_watcher(sales_data.SALES_SOURCE, QUERY_BACKEND)
     
     if not st.session_state.logged_in:
         if st.session_state.page == "login":
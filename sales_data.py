@@ -0,0 +1,1281 @@
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; stores are then never appended to in place
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+import sales_topk
+
+# -----------------------
+# CONFIG
+# -----------------------
+SALES_FILE = "salesdata.csv"
+
+# A single CSV, a directory of year=YYYY/month=MM/*.csv partitions, or a
+# columnar dataset directory written by generate_sales_data
+SALES_SOURCE = os.getenv("SALES_SOURCE", SALES_FILE)
+
+CACHE_SUFFIX = ".cache"
+CACHE_META_FILE = "meta.json"
+# meta.json is replaced on every swap, so writers lock this file beside it
+CACHE_LOCK_FILE = "meta.json.lock"
+# v4: rows are stored sorted by Date
+# v5: duplicates are dropped after cleaning rather than before
+CACHE_FORMAT_VERSION = 5
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+NS_PER_DAY = 86_400 * 1_000_000_000
+PREFIX_HASH_BYTES = 64 * 1024
+
+# How often the background watcher stats the sales source; 0 disables it
+WATCH_INTERVAL_SECONDS = float(os.getenv("SALES_WATCH_INTERVAL", "2"))
+
+# -----------------------
+# FILE SIGNATURES
+# -----------------------
+def cache_dir_for(csv_path):
+    """Return the columnar cache directory that sits next to a CSV file"""
+    return csv_path + CACHE_SUFFIX
+
+def file_signature(csv_path):
+    """Return the cheap (size, mtime) signature of a file"""
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def file_content_hash(csv_path):
+    """Return the SHA256 of a file, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# -----------------------
+# SCHEMA
+# -----------------------
+# Declared types for the README "Data Requirements" columns plus the
+# Unit_Price and Sales_Rep columns our exports also carry
+DATE_FORMAT = "%Y-%m-%d"
+SALES_SCHEMA = {
+    "Date": "date",
+    "Region": "dimension",
+    "Category": "dimension",
+    "Product": "dimension",
+    "Sales_Rep": "dimension",
+    "Quantity": "count",
+    "Unit_Price": "price",
+    "Revenue": "amount"
+}
+
+def schema_read_dtypes():
+    """dtype= mapping that makes read_csv dictionary-encode the dimension columns"""
+    return {name: "category" for name, kind in SALES_SCHEMA.items() if kind == "dimension"}
+
+def _parse_dates(series):
+    """Parse dates with the fixed export format; cleaned frames already hold datetimes"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, format=DATE_FORMAT)
+
+def _is_whole(series):
+    values = series.to_numpy()
+    return not series.isna().any() and bool(np.all(np.mod(values, 1) == 0))
+
+def apply_sales_schema(df):
+    """Cast a raw sales frame to the declared compact dtypes"""
+    df = df.copy(deep=False)
+    for name, kind in SALES_SCHEMA.items():
+        if name not in df.columns:
+            continue
+        series = df[name]
+        if kind == "date":
+            df[name] = _parse_dates(series)
+        elif kind == "dimension":
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[name] = series.astype("category")
+        elif not pd.api.types.is_numeric_dtype(series):
+            continue
+        elif _is_whole(series):
+            # Whole numbers shrink to the narrowest integer; pandas still sums in int64
+            df[name] = pd.to_numeric(series, downcast="integer")
+        elif kind == "price":
+            # Prices are shown, never summed, so float32 is fine when it is lossless.
+            # Fractional amounts stay float64 so totals keep their paise
+            narrow = series.astype(np.float32)
+            if narrow.astype(series.dtype).equals(series):
+                df[name] = narrow
+    return df
+
+def memory_report(before, after):
+    """Bytes per column before and after the schema is applied"""
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "Column": before_bytes.index,
+        "Before dtype": [str(before[c].dtype) for c in before_bytes.index],
+        "After dtype": [str(after[c].dtype) for c in before_bytes.index],
+        "Before (bytes)": before_bytes.to_numpy(),
+        "After (bytes)": after_bytes.reindex(before_bytes.index).to_numpy()
+    })
+    total = pd.DataFrame([{
+        "Column": "Total",
+        "Before dtype": "",
+        "After dtype": "",
+        "Before (bytes)": report["Before (bytes)"].sum(),
+        "After (bytes)": report["After (bytes)"].sum()
+    }])
+    report = pd.concat([report, total], ignore_index=True)
+    report["Saved %"] = (1 - report["After (bytes)"] / report["Before (bytes)"]) * 100
+    return report
+
+def schema_memory_report(csv_path, nrows=None):
+    """Parse the CSV with default dtypes and with the schema, and compare memory"""
+    before = pd.read_csv(csv_path, parse_dates=["Date"], nrows=nrows)
+    after = read_sales_csv(csv_path, nrows=nrows)
+    return memory_report(before, after)
+
+# -----------------------
+# CLEANING
+# -----------------------
+# Ported from section 4 of codesalestask5.ipynb. Labels are whitespace-normalised
+# but not title-cased, which would rename products such as "BBQ Grill", and
+# Revenue is only recomputed where it is missing rather than overwritten
+NUMERIC_COLUMNS = ["Quantity", "Unit_Price", "Revenue"]
+
+def new_cleaning_report():
+    """Counts of what the cleaning stage dropped, coerced and filled"""
+    return {
+        "rows_read": 0,
+        "duplicates_dropped": 0,
+        "bad_dates_dropped": 0,
+        "missing_product_dropped": 0,
+        "coerced": {name: 0 for name in NUMERIC_COLUMNS},
+        "quantity_filled": 0,
+        "unit_price_filled": 0,
+        "revenue_recomputed": 0,
+        "rows_kept": 0
+    }
+
+def merge_cleaning_reports(a, b):
+    """Add two cleaning reports together"""
+    merged = {}
+    for key, value in a.items():
+        if isinstance(value, dict):
+            merged[key] = {name: value.get(name, 0) + b.get(key, {}).get(name, 0) for name in value}
+        else:
+            merged[key] = value + b.get(key, 0)
+    return merged
+
+def normalize_column_names(df):
+    """Map ' unit price ' style headers onto the schema's column names"""
+    canonical = {name.lower(): name for name in SALES_SCHEMA}
+    renamed = {}
+    for name in df.columns:
+        key = str(name).strip().lower().replace(" ", "_")
+        renamed[name] = canonical.get(key, str(name).strip())
+    return df.rename(columns=renamed)
+
+def _strip_labels(series):
+    """Trim and collapse whitespace, working on the dictionary for categoricals"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        labels = pd.Series(series.cat.categories.astype(str)).str.strip().str.replace(r"\s+", " ", regex=True)
+        labels = labels.where(labels != "")
+        codes, uniques = pd.factorize(labels)
+        # A trailing -1 maps missing codes to missing, even when there are no categories at all
+        new_codes = np.append(codes, -1)[series.cat.codes.to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories=uniques), index=series.index)
+    stripped = series.astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+    return stripped.where(stripped != "").astype(object)
+
+def _parse_dates_lenient(series):
+    """Parse dates with the fixed format, inferring the odd one out and coercing garbage to NaT"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    parsed = pd.to_datetime(series, format=DATE_FORMAT, errors="coerce")
+    retry = parsed.isna() & series.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(series[retry], format="mixed", errors="coerce")
+    return parsed
+
+# Duplicates are whole rows that are equal once cleaned. Within one frame
+# drop_duplicates finds them. Rows appended to a loaded frame are checked with
+# a row filter: a sorted index of the frame's whole-row hashes, in runs merged
+# like a binary counter, that only picks candidates. A candidate is dropped
+# once it compares equal to its frame row, so a hash collision never loses a row
+def row_hashes(df):
+    """64-bit hashes of whole rows; numbers hash by value, whatever their width"""
+    columns = {}
+    for name in sorted(df.columns):
+        series = df[name]
+        if series.dtype.kind in "iuf":
+            series = series.astype(np.float64)
+        elif series.dtype.kind == "M":
+            series = series.astype("datetime64[ns]")
+        columns[name] = series
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+
+def _plain(series):
+    """Column values that compare by value across frames, whatever their dictionaries or widths"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(object).to_numpy()
+    return series.to_numpy()
+
+def rows_equal(a, b):
+    """Whether each row of a equals the row at the same position of b, missing values matching missing values"""
+    equal = np.ones(len(a), dtype=bool)
+    for name in a.columns:
+        if name not in b.columns:
+            return np.zeros(len(a), dtype=bool)
+        x, y = _plain(a[name]), _plain(b[name])
+        equal &= (x == y) | (pd.isna(x) & pd.isna(y))
+    return equal
+
+def new_row_filter(frame):
+    """A filter of the rows of a de-duplicated frame"""
+    return extend_row_filter({"frame": frame, "runs": []}, frame, 0)
+
+def extend_row_filter(seen, frame, start):
+    """The filter of a frame whose rows before start are the rows a filter has seen"""
+    hashes = row_hashes(frame.iloc[start:])
+    order = np.argsort(hashes, kind="stable")
+    run = (hashes[order], order.astype(np.int64) + start)
+    runs = list(seen["runs"])
+    while runs and len(runs[-1][0]) <= len(run[0]):
+        last = runs.pop()
+        hashes = np.concatenate([last[0], run[0]])
+        order = np.argsort(hashes, kind="stable")
+        run = (hashes[order], np.concatenate([last[1], run[1]])[order])
+    if len(run[0]):
+        runs.append(run)
+    return {"frame": frame, "runs": runs}
+
+def drop_seen_rows(df, seen):
+    """Drop the rows equal to a row of the filter's frame"""
+    hashes = row_hashes(df)
+    repeat = np.zeros(len(hashes), dtype=bool)
+    frame = seen["frame"]
+    for run_hashes, run_rows in seen["runs"]:
+        first = np.searchsorted(run_hashes, hashes, side="left")
+        matches = np.searchsorted(run_hashes, hashes, side="right") - first
+        # Rows of a de-duplicated frame rarely share a hash; when they do, each
+        # of them is compared in turn
+        for i in range(int(matches.max(initial=0))):
+            candidates = np.flatnonzero((matches > i) & ~repeat)
+            if len(candidates) == 0:
+                break
+            rows = run_rows[first[candidates] + i]
+            repeat[candidates] = rows_equal(df.iloc[candidates], frame.iloc[rows])
+    return df[~repeat]
+
+def clean_sales_data(df, seen=None):
+    """Normalise, coerce and de-duplicate a raw sales frame, skipping rows seen by a row filter; returns (frame, report)"""
+    report = new_cleaning_report()
+    report["rows_read"] = len(df)
+    df = normalize_column_names(df)
+
+    for name, kind in SALES_SCHEMA.items():
+        if kind == "dimension" and name in df.columns:
+            df[name] = _strip_labels(df[name])
+
+    for name in NUMERIC_COLUMNS:
+        if name in df.columns and not pd.api.types.is_numeric_dtype(df[name]):
+            raw = df[name]
+            df[name] = pd.to_numeric(raw, errors="coerce")
+            report["coerced"][name] = int((df[name].isna() & raw.notna()).sum())
+
+    if "Date" in df.columns:
+        df["Date"] = _parse_dates_lenient(df["Date"])
+        bad_dates = df["Date"].isna()
+        report["bad_dates_dropped"] = int(bad_dates.sum())
+        df = df[~bad_dates]
+    if "Product" in df.columns:
+        missing_product = df["Product"].isna()
+        report["missing_product_dropped"] = int(missing_product.sum())
+        df = df[~missing_product]
+
+    if "Unit_Price" in df.columns:
+        missing = df["Unit_Price"].isna()
+        if missing.any():
+            df.loc[missing, "Unit_Price"] = df["Unit_Price"].median()
+            report["unit_price_filled"] = int(missing.sum())
+    if "Quantity" in df.columns:
+        missing = df["Quantity"].isna()
+        if missing.any():
+            df.loc[missing, "Quantity"] = 0
+            report["quantity_filled"] = int(missing.sum())
+    if {"Revenue", "Unit_Price", "Quantity"} <= set(df.columns):
+        missing = df["Revenue"].isna()
+        if missing.any():
+            df.loc[missing, "Revenue"] = df.loc[missing, "Unit_Price"] * df.loc[missing, "Quantity"]
+            report["revenue_recomputed"] = int(missing.sum())
+
+    # De-duplicate the cleaned rows, which look the same in a chunk as in the
+    # whole file and the same in a loaded store as in a freshly parsed tail
+    before = len(df)
+    df = df.drop_duplicates()
+    if seen is not None:
+        df = drop_seen_rows(df, seen)
+    report["duplicates_dropped"] = before - len(df)
+
+    report["rows_kept"] = len(df)
+    return df.reset_index(drop=True), report
+
+# -----------------------
+# CSV LOADING
+# -----------------------
+def prepare_sales_frame(raw, seen=None):
+    """Clean a raw parsed frame and cast it to the schema; the report rides in attrs"""
+    df, report = clean_sales_data(raw, seen)
+    df = apply_sales_schema(df)
+    df.attrs["cleaning"] = report
+    return df
+
+def read_sales_csv(csv_path, seen=None, **kwargs):
+    """Parse the sales CSV into a clean DataFrame with the declared schema"""
+    return prepare_sales_frame(pd.read_csv(csv_path, dtype=schema_read_dtypes(), **kwargs), seen)
+
+def sort_by_date(df):
+    """Order rows by Date, keeping same-day rows in file order; sorted frames are returned as-is"""
+    if df["Date"].is_monotonic_increasing:
+        return df
+    order = np.argsort(df["Date"].to_numpy(), kind="stable")
+    return df.take(order).reset_index(drop=True)
+
+def estimate_csv_rows(csv_path):
+    """Estimate a CSV's row count from the line density of its first megabyte"""
+    with open(csv_path, "rb") as f:
+        head = f.read(1024 * 1024)
+    lines = max(1, head.count(b"\n") - 1)
+    return os.path.getsize(csv_path) * lines / max(1, len(head))
+
+# A file read in chunks must drop the same duplicates as a file read whole,
+# without remembering every row. Cleaned chunks are spilled to temporary files
+# by row hash, so equal rows land in the same partition, and each partition,
+# about one chunk of rows, is de-duplicated on its own. A file that fits in a
+# single chunk is never spilled
+def _spill(path, frame):
+    with open(path, "ab") as f:
+        pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _unspill(path):
+    frames = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                frames.append(pickle.load(f))
+            except EOFError:
+                return frames
+
+def iter_sales_csv(csv_path, chunksize):
+    """Parse the sales CSV in clean, typed frames of about chunksize rows, de-duplicated across the whole file"""
+    reader = pd.read_csv(csv_path, dtype=schema_read_dtypes(), chunksize=chunksize)
+    first = next(reader, None)
+    if first is None:
+        return
+    first = prepare_sales_frame(first)
+    second = next(reader, None)
+    if second is None:
+        yield first
+        return
+
+    partitions = max(2, int(np.ceil(estimate_csv_rows(csv_path) / chunksize)))
+    with tempfile.TemporaryDirectory(prefix="sales_spill_") as spill_dir:
+        paths = [os.path.join(spill_dir, f"{p}.pkl") for p in range(partitions)]
+        for chunk in itertools.chain([first], (prepare_sales_frame(c) for c in itertools.chain([second], reader))):
+            keys = row_hashes(chunk) % np.uint64(partitions)
+            order = np.argsort(keys, kind="stable")
+            bounds = np.searchsorted(keys[order], np.arange(partitions + 1))
+            for p in np.flatnonzero(np.diff(bounds)):
+                _spill(paths[p], chunk.take(order[bounds[p]:bounds[p + 1]]))
+        del first, second, chunk
+        for path in paths:
+            if os.path.exists(path):
+                # Blocks were spilled in file order, so the first copy of a row is kept
+                yield apply_sales_schema(concat_sales_frames(_unspill(path)).drop_duplicates().reset_index(drop=True))
+
+# -----------------------
+# COLUMNAR CACHE
+# -----------------------
+def load_cache_meta(cache_dir):
+    """Load the cache metadata, or None if there is no usable cache"""
+    meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_FORMAT_VERSION:
+        return None
+    return meta
+
+def save_cache_meta(cache_dir, meta):
+    """Write cache metadata atomically so readers never see a partial file"""
+    meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, meta_path)
+
+def cache_is_fresh(meta, csv_path, cache_dir):
+    """Check a cache against its CSV by size and mtime, falling back to the content hash"""
+    if meta is None:
+        return False
+    size, mtime_ns = file_signature(csv_path)
+    if meta["size"] != size:
+        return False
+    if meta["mtime_ns"] == mtime_ns:
+        return True
+
+    # Same size but touched: only the content hash can tell us if it changed
+    if file_content_hash(csv_path) != meta["sha256"]:
+        return False
+    meta["mtime_ns"] = mtime_ns
+    save_cache_meta(cache_dir, meta)
+    return True
+
+@contextlib.contextmanager
+def store_lock(cache_dir):
+    """Hold a store's writer lock across processes; yields False where file locks are unavailable"""
+    if fcntl is None:
+        yield False
+        return
+    with open(os.path.join(cache_dir, CACHE_LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def write_columnar_cache(df, csv_path, cache_dir, signature):
+    """Write a DataFrame as one .npy file per column next to its CSV"""
+    size, mtime_ns = signature
+    content_hash = file_content_hash(csv_path)
+    if file_signature(csv_path) != signature:
+        # The CSV changed while we were parsing it; the next load will retry
+        return
+    with store_lock(cache_dir):
+        _write_columnar_files(df, cache_dir, size, mtime_ns, content_hash)
+
+def _write_columnar_files(df, cache_dir, size, mtime_ns, content_hash):
+    """Write the column files and meta.json of a fresh store build, then drop older builds"""
+    # Each build goes into its own data directory and meta.json is swapped last,
+    # so a reader holding the old meta keeps reading a complete set of files
+    data_dir = content_hash[:16]
+    data_path = os.path.join(cache_dir, data_dir)
+    if os.path.exists(data_path):
+        shutil.rmtree(data_path)
+    os.makedirs(data_path)
+
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        entry = {"name": name, "file": f"{len(columns)}.npy"}
+        if pd.api.types.is_datetime64_any_dtype(series):
+            entry["kind"] = "datetime"
+            values = series.to_numpy().astype("datetime64[ns]").view("int64")
+            if (values % NS_PER_DAY == 0).all():
+                entry["unit"] = "D"
+                values = values // NS_PER_DAY
+            else:
+                entry["unit"] = "ns"
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            entry["kind"] = "numeric"
+            values = series.to_numpy()
+        else:
+            entry["kind"] = "dictionary"
+            codes, uniques = pd.factorize(series)
+            entry["labels"] = [str(v) for v in uniques]
+            values = codes.astype(codes_dtype_for(len(uniques)))
+        np.save(os.path.join(data_path, entry["file"]), values, allow_pickle=False)
+        columns.append(entry)
+
+    save_cache_meta(cache_dir, {
+        "version": CACHE_FORMAT_VERSION,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "sha256": content_hash,
+        "rows": len(df),
+        "data_dir": data_dir,
+        "columns": columns,
+        "cleaning": df.attrs.get("cleaning")
+    })
+
+    for entry in os.listdir(cache_dir):
+        stale_path = os.path.join(cache_dir, entry)
+        if entry != data_dir and os.path.isdir(stale_path):
+            shutil.rmtree(stale_path, ignore_errors=True)
+
+def codes_dtype_for(n_labels):
+    """Pick the integer width pandas itself uses for categorical codes"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_labels < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def open_columnar_store(cache_dir, meta):
+    """Map every cached column read-only; the OS page cache holds the only copy"""
+    data_path = os.path.join(cache_dir, meta["data_dir"])
+    store = {
+        "data_dir": meta["data_dir"],
+        "rows": meta["rows"],
+        "size": meta["size"],
+        "cleaning": meta.get("cleaning"),
+        "columns": {},
+        "dictionaries": {},
+        "kinds": {}
+    }
+    for entry in meta["columns"]:
+        # Files may hold rows appended after this meta was read; map only its rows
+        values = np.load(os.path.join(data_path, entry["file"]), mmap_mode="r", allow_pickle=False)[:meta["rows"]]
+        store["columns"][entry["name"]] = values
+        store["kinds"][entry["name"]] = entry["kind"]
+        if entry["kind"] == "datetime":
+            store.setdefault("date_units", {})[entry["name"]] = entry["unit"]
+        elif entry["kind"] == "dictionary":
+            store["dictionaries"][entry["name"]] = entry["labels"]
+    return store
+
+def store_to_frame(store):
+    """Build a DataFrame over a mapped store without copying the mapped columns"""
+    columns = {}
+    for name, values in store["columns"].items():
+        kind = store["kinds"][name]
+        if kind == "datetime":
+            # Days are widened to timestamps for the .dt accessors; this one
+            # column is materialised per process
+            if store["date_units"][name] == "D":
+                columns[name] = (values * NS_PER_DAY).view("datetime64[ns]")
+            else:
+                columns[name] = values.view("datetime64[ns]")
+        elif kind == "dictionary":
+            columns[name] = pd.Categorical.from_codes(
+                values, categories=store["dictionaries"][name], validate=False
+            )
+        else:
+            columns[name] = values
+    return pd.DataFrame(columns, copy=False)
+
+def open_sales_store(csv_path=SALES_FILE):
+    """Open the memory-mapped sales store, building it from the CSV when stale"""
+    cache_dir = cache_dir_for(csv_path)
+    meta = load_cache_meta(cache_dir)
+    if not cache_is_fresh(meta, csv_path, cache_dir):
+        signature = file_signature(csv_path)
+        df = sort_by_date(read_sales_csv(csv_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        write_columnar_cache(df, csv_path, cache_dir, signature)
+        meta = load_cache_meta(cache_dir)
+        if not cache_is_fresh(meta, csv_path, cache_dir):
+            raise OSError(f"could not build a fresh sales store for {csv_path}")
+    return open_columnar_store(cache_dir, meta)
+
+# Appended rows dated on or after a store's last row are written to the end of
+# its column files, so the store stays sorted and is never rewritten. Each file
+# gets its rows, then its grown header, and meta.json is swapped in last; a
+# store opened from the old meta maps only its old rows. The grown header must
+# fit in place, which the spare space np.save leaves in headers allows.
+# Processes serving the same CSV append under the store lock, and one that
+# finds the rows already appended by another maps the grown store instead
+_NPY_HEADERS = {
+    (1, 0): (np.lib.format.read_array_header_1_0, np.lib.format.write_array_header_1_0),
+    (2, 0): (np.lib.format.read_array_header_2_0, np.lib.format.write_array_header_2_0)
+}
+
+def _grown_npy_header(path, rows, added):
+    """(dtype, header) for a .npy file of rows rows grown by added rows, or None when the header cannot be rewritten in place"""
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version not in _NPY_HEADERS:
+            return None
+        shape, fortran_order, dtype = _NPY_HEADERS[version][0](f)
+        length = f.tell()
+    if shape != (rows,) or os.path.getsize(path) != length + rows * dtype.itemsize:
+        return None
+    header = io.BytesIO()
+    _NPY_HEADERS[version][1](header, {
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "fortran_order": fortran_order,
+        "shape": (rows + added,)
+    })
+    header = header.getvalue()
+    return (dtype, header) if len(header) == length else None
+
+def _store_encoding(entry, series, dtype):
+    """(values, entry) encoding a column's new rows like a stored column, or None when they do not fit its dtype"""
+    if entry["kind"] == "datetime":
+        values = series.to_numpy().astype("datetime64[ns]").view("int64")
+        if entry["unit"] == "D":
+            if (values % NS_PER_DAY).any():
+                return None
+            values = values // NS_PER_DAY
+        return values.astype(dtype), entry
+    if entry["kind"] == "dictionary":
+        column = pd.Categorical(series)
+        labels = list(entry["labels"])
+        positions = {label: i for i, label in enumerate(labels)}
+        for label in column.categories.astype(str):
+            if label not in positions:
+                positions[label] = len(labels)
+                labels.append(label)
+        if len(labels) >= np.iinfo(dtype).max:
+            return None
+        mapping = np.array([positions[label] for label in column.categories.astype(str)] + [-1], dtype=np.int64)
+        return mapping[column.codes].astype(dtype), {**entry, "labels": labels}
+    values = series.to_numpy()
+    if values.dtype.kind not in "iufb":
+        return None
+    narrow = values.astype(dtype)
+    if not np.array_equal(narrow.astype(np.float64), values.astype(np.float64), equal_nan=True):
+        return None
+    return narrow, entry
+
+def append_to_sales_store(csv_path, tail, store, offset, cleaning):
+    """Write rows that follow a mapped store's last row to the end of its columns; returns the grown store, or None when it cannot take them"""
+    cache_dir = cache_dir_for(csv_path)
+    with store_lock(cache_dir) as locked:
+        meta = load_cache_meta(cache_dir)
+        if not locked or meta is None or meta["data_dir"] != store["data_dir"]:
+            return None
+        if meta["rows"] != store["rows"]:
+            # Another process appended first. The file only grew since our rows,
+            # so once its store reaches offset it already holds this tail
+            return open_columnar_store(cache_dir, meta) if meta["size"] >= offset > store["size"] else None
+        return _append_store_rows(csv_path, cache_dir, meta, tail, offset, cleaning)
+
+def _append_store_rows(csv_path, cache_dir, meta, tail, offset, cleaning):
+    """Grow the store described by meta by the tail's rows, or return None when they do not fit its files"""
+    rows = meta["rows"]
+    if [e["name"] for e in meta["columns"]] != list(tail.columns):
+        return None
+    data_path = os.path.join(cache_dir, meta["data_dir"])
+    writes, columns = [], []
+    for entry in meta["columns"]:
+        path = os.path.join(data_path, entry["file"])
+        grown = _grown_npy_header(path, rows, len(tail))
+        encoded = grown and _store_encoding(entry, tail[entry["name"]], grown[0])
+        if not encoded:
+            return None
+        writes.append((path, encoded[0], grown[1]))
+        columns.append(encoded[1])
+
+    for path, values, header in writes:
+        with open(path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(values).tobytes())
+            f.seek(0)
+            f.write(header)
+    size, mtime_ns = file_signature(csv_path)
+    meta = {
+        **meta,
+        "size": offset,
+        # Unknown until the file is hashed again; a touched file is then rebuilt
+        "mtime_ns": mtime_ns if size == offset else None,
+        "sha256": None,
+        "rows": rows + len(tail),
+        "columns": columns,
+        "cleaning": cleaning
+    }
+    save_cache_meta(cache_dir, meta)
+    return open_columnar_store(cache_dir, meta)
+
+def load_sales_data(csv_path=SALES_FILE):
+    """Load sales data backed by the shared memory-mapped store"""
+    if is_columnar_dataset(csv_path):
+        return store_to_frame(open_columnar_dataset(csv_path))
+    try:
+        return store_to_frame(open_sales_store(csv_path))
+    except (OSError, ValueError, KeyError):
+        # A read-only or broken cache directory just means we parse the CSV every time
+        return read_sales_csv(csv_path)
+
+# -----------------------
+# INCREMENTAL INGEST
+# -----------------------
+# Readers take state["snapshot"] once per rerun and never lock. A builder
+# (the watcher thread, or a rerun when no watcher runs) assembles a complete
+# new snapshot under the build lock and publishes it with a single reference
+# swap, so a reader sees either the old snapshot or the new one, never a mix.
+# Published snapshots are never mutated. derive(snapshot, previous) may return
+# extra entries (indexes, aggregates) to build into every snapshot before it is
+# swapped in; previous, when given, is a snapshot whose rows are this one's
+# first rows, so what was derived from it can be extended rather than rebuilt.
+def new_ingest_state(derive=None):
+    """Create an empty ingest state; share one per data file across sessions"""
+    return {
+        "lock": threading.Lock(),
+        "derive": derive,
+        "snapshot": None,
+        "columns": None,
+        "offset": 0,
+        "header_hash": None,
+        "prefix_hash": None,
+        "boundary_hash": None,
+        "seen": None,
+        "store": None,
+        "signature": None,
+        "version": 0,
+        "full_loads": 0,
+        "appends": 0
+    }
+
+def _read_window(f, start, end):
+    """Read bytes [start, end) from an open file"""
+    f.seek(start)
+    return f.read(end - start)
+
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _file_fingerprint(f, offset):
+    """Hash the header line, the leading bytes and the bytes just before offset"""
+    head = _read_window(f, 0, min(offset, PREFIX_HASH_BYTES))
+    header = head.split(b"\n", 1)[0]
+    boundary = _read_window(f, max(0, offset - PREFIX_HASH_BYTES), offset)
+    return _hash_bytes(header), _hash_bytes(head), _hash_bytes(boundary)
+
+def concat_sales_frames(frames):
+    """Concatenate sales frames, merging categorical dictionaries instead of falling back to object"""
+    first = frames[0]
+    columns = {}
+    for name in first.columns:
+        if isinstance(first[name].dtype, pd.CategoricalDtype):
+            columns[name] = pd.api.types.union_categoricals(
+                [pd.Categorical(f[name]) for f in frames], ignore_order=True
+            )
+        else:
+            # Compact widths may differ between frames; let NumPy promote
+            columns[name] = np.concatenate([f[name].to_numpy() for f in frames])
+    return pd.DataFrame(columns)
+
+def append_sales_rows(frame, tail):
+    """Append parsed rows to a sales frame"""
+    return concat_sales_frames([frame, tail])
+
+def product_revenue_totals(frame):
+    """Revenue per product, keyed by plain product names so totals can be added"""
+    totals = frame.groupby("Product", observed=True)["Revenue"].sum()
+    totals.index = totals.index.astype(str)
+    return totals
+
+# Process-wide snapshot ids, so caches can tell any two snapshots apart
+_snapshot_ids = itertools.count(1)
+
+def build_snapshot(frame, product_ranking, cleaning, derive=None, version=1, source=None, previous=None):
+    """Assemble a snapshot of a frame, sorted by Date, and everything derived from it (or extended from previous); later snapshots of a source replace earlier ones"""
+    frame = sort_by_date(frame)
+    snapshot = {
+        "id": next(_snapshot_ids),
+        "source": source,
+        "version": version,
+        "frame": frame,
+        "rows": len(frame),
+        "product_ranking": product_ranking,
+        "cleaning": cleaning
+    }
+    if derive is not None:
+        snapshot.update(derive(snapshot, previous))
+    return snapshot
+
+def _publish(state, csv_path, bookkeeping, frame, product_ranking, cleaning, counter, extends=False):
+    """Build a complete snapshot, extending the current one when frame only adds rows after its rows, then swap it and the bookkeeping in"""
+    snapshot = build_snapshot(
+        frame, product_ranking, cleaning, state["derive"], state["version"] + 1,
+        source=csv_path, previous=state["snapshot"] if extends else None
+    )
+
+    state.update(bookkeeping)
+    state["version"] = snapshot["version"]
+    state[counter] += 1
+    state["snapshot"] = snapshot
+
+def _full_ingest(csv_path, state):
+    """Reload the whole file and reset the ingest bookkeeping"""
+    signature = file_signature(csv_path)
+    try:
+        store = open_sales_store(csv_path)
+        frame = store_to_frame(store)
+        offset = store["size"]
+        cleaning = store["cleaning"]
+    except (OSError, ValueError, KeyError):
+        store = None
+        offset = signature[0]
+        frame = read_sales_csv(csv_path)
+        cleaning = frame.attrs["cleaning"]
+
+    with open(csv_path, "rb") as f:
+        header_hash, prefix_hash, boundary_hash = _file_fingerprint(f, offset)
+
+    bookkeeping = {
+        "columns": list(frame.columns),
+        "offset": offset,
+        "header_hash": header_hash,
+        "prefix_hash": prefix_hash,
+        "boundary_hash": boundary_hash,
+        "seen": None,
+        "store": store,
+        # The file as it was when offset was taken; None when it already differed
+        "signature": signature if signature[0] == offset else None
+    }
+    _publish(state, csv_path, bookkeeping, frame, sales_topk.new_ranking(product_revenue_totals(frame)),
+             cleaning or new_cleaning_report(), "full_loads")
+
+def _ingest_columnar_dataset(path, state):
+    """Map a columnar dataset again whenever its metadata changes; it is already typed, sorted and clean"""
+    signature = source_signature(path)
+    if state["snapshot"] is not None and signature == state["signature"]:
+        return
+    store = open_columnar_dataset(path)
+    frame = store_to_frame(store)
+    bookkeeping = {"columns": list(frame.columns), "signature": signature, "store": store}
+    _publish(state, path, bookkeeping, frame, sales_topk.new_ranking(product_revenue_totals(frame)), None, "full_loads")
+
+def ingest_sales_data(csv_path=SALES_FILE, state=None):
+    """Bring an ingest state up to date, parsing only rows appended since the last call"""
+    if state is None:
+        state = new_ingest_state()
+
+    if is_columnar_dataset(csv_path):
+        with state["lock"]:
+            _ingest_columnar_dataset(csv_path, state)
+        return state
+
+    with state["lock"]:
+        snapshot = state["snapshot"]
+        if snapshot is None:
+            _full_ingest(csv_path, state)
+            return state
+
+        signature = file_signature(csv_path)
+        size = signature[0]
+        if size == state["offset"]:
+            if signature != state["signature"]:
+                # Written again at the same size. Nothing was appended, so any
+                # change is a rewrite, and it may lie outside the hashed windows
+                _full_ingest(csv_path, state)
+            return state
+        if size < state["offset"]:
+            # Truncated: this is a rewrite, not an append
+            _full_ingest(csv_path, state)
+            return state
+
+        with open(csv_path, "rb") as f:
+            if _file_fingerprint(f, state["offset"]) != (
+                state["header_hash"], state["prefix_hash"], state["boundary_hash"]
+            ):
+                rewritten = True
+            else:
+                rewritten = False
+                tail_bytes = _read_window(f, state["offset"], size)
+
+        if rewritten:
+            _full_ingest(csv_path, state)
+            return state
+
+        # Only consume complete lines; a half-written last row waits for the next call
+        last_newline = tail_bytes.rfind(b"\n")
+        if last_newline < 0:
+            return state
+        tail_bytes = tail_bytes[:last_newline + 1]
+
+        if state["seen"] is None:
+            # Built on the first append, so loads that are never appended to skip it
+            state["seen"] = new_row_filter(snapshot["frame"])
+        tail = read_sales_csv(io.BytesIO(tail_bytes), state["seen"], header=None, names=state["columns"])
+        cleaning = merge_cleaning_reports(snapshot["cleaning"], tail.attrs["cleaning"])
+        tail = sort_by_date(tail)
+        new_offset = state["offset"] + len(tail_bytes)
+
+        frame = snapshot["frame"]
+        # Rows dated on or after the last row extend the snapshot and the store
+        # in place; earlier rows mean a re-sort and a full derive
+        extends = len(frame) > 0 and (len(tail) == 0 or tail["Date"].iloc[0] >= frame["Date"].iloc[-1])
+        store = None
+        if state["store"] is not None:
+            store = append_to_sales_store(csv_path, tail, state["store"], new_offset, cleaning) if extends else None
+            if store is None:
+                # A store is shared with other processes; rebuild it rather
+                # than keep a private copy that drifts from it
+                _full_ingest(csv_path, state)
+                return state
+            frame = store_to_frame(store)
+            # Another process may have appended further than this tail
+            tail = frame.iloc[len(snapshot["frame"]):]
+            new_offset = store["size"]
+            cleaning = store["cleaning"] or cleaning
+        elif len(tail):
+            frame = append_sales_rows(frame, tail)
+
+        bookkeeping = {
+            "offset": new_offset,
+            "signature": signature if new_offset == size else None,
+            "store": store,
+            # An extended frame keeps its row ids, so the filter only indexes
+            # the new rows; a re-sorted one is filtered afresh on the next append
+            "seen": extend_row_filter(state["seen"], frame, len(snapshot["frame"])) if extends else None
+        }
+        with open(csv_path, "rb") as f:
+            boundary = _read_window(f, max(0, new_offset - PREFIX_HASH_BYTES), new_offset)
+            bookkeeping["boundary_hash"] = _hash_bytes(boundary)
+            if state["offset"] < PREFIX_HASH_BYTES:
+                head = _read_window(f, 0, min(new_offset, PREFIX_HASH_BYTES))
+                bookkeeping["prefix_hash"] = _hash_bytes(head)
+
+        _publish(
+            state, csv_path, bookkeeping, frame,
+            sales_topk.update_ranking(snapshot["product_ranking"], product_revenue_totals(tail)),
+            cleaning, "appends", extends
+        )
+        return state
+
+# -----------------------
+# BACKGROUND WATCHER
+# -----------------------
+def source_signature(source):
+    """A cheap token that changes whenever a file or any partition under a directory changes"""
+    if is_columnar_dataset(source):
+        # meta.json is swapped in last whenever a dataset is written
+        return file_signature(os.path.join(source, CACHE_META_FILE))
+    if is_partitioned(source):
+        return tuple((rel, *file_signature(os.path.join(source, rel))) for rel in list_partition_files(source))
+    return file_signature(source)
+
+def watch_sales_source(source, refresh, interval=WATCH_INTERVAL_SECONDS):
+    """Call refresh() on a daemon thread now and again whenever the source changes; returns (thread, stop event)"""
+    stop = threading.Event()
+
+    def run():
+        seen = None
+        while True:
+            try:
+                current = source_signature(source)
+                if current != seen:
+                    refresh()
+                    seen = current
+            except Exception as e:
+                # Keep serving the last good snapshot; retry on the next poll
+                print(f"sales watcher: refresh of '{source}' failed: {e}", file=sys.stderr)
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=run, name=f"sales-watcher:{source}", daemon=True)
+    thread.start()
+    return thread, stop
+
+# -----------------------
+# PARTITIONED DATASETS
+# -----------------------
+PARTITION_INDEX_FILE = "_partitions.json"
+PARTITION_INDEX_VERSION = 1
+PARTITION_PATTERN = re.compile(r"year=(\d{4})/month=(\d{1,2})/")
+
+def is_partitioned(source):
+    """Whether a sales source is a partitioned directory rather than one CSV or a columnar dataset"""
+    return os.path.isdir(source) and not is_columnar_dataset(source)
+
+def list_partition_files(root):
+    """Relative paths of every CSV under a partitioned directory, in sorted order"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.endswith(CACHE_SUFFIX))
+        for filename in sorted(filenames):
+            if filename.endswith(".csv"):
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), root)
+                paths.append(rel_path.replace(os.sep, "/"))
+    return paths
+
+def scan_partition(csv_path):
+    """Read just the Date and Revenue columns of one partition for the index"""
+    cols = pd.read_csv(csv_path, usecols=["Date", "Revenue"])
+    dates = _parse_dates_lenient(cols["Date"]).dropna()
+    cols["Revenue"] = pd.to_numeric(cols["Revenue"], errors="coerce")
+    if dates.empty:
+        return {"rows": 0, "min_date": None, "max_date": None, "revenue": 0}
+    return {
+        "rows": len(dates),
+        "min_date": dates.min().date().isoformat(),
+        "max_date": dates.max().date().isoformat(),
+        "revenue": float(cols["Revenue"].sum())
+    }
+
+def load_partition_index(root):
+    """Load the partition index, or an empty one if it is missing or outdated"""
+    index_path = os.path.join(root, PARTITION_INDEX_FILE)
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == PARTITION_INDEX_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+    return {"version": PARTITION_INDEX_VERSION, "partitions": {}}
+
+def refresh_partition_index(root):
+    """Bring the index of per-partition date ranges and row counts up to date"""
+    index = load_partition_index(root)
+    old_partitions = index["partitions"]
+    partitions = {}
+    changed = False
+    for rel_path in list_partition_files(root):
+        size, mtime_ns = file_signature(os.path.join(root, rel_path))
+        entry = old_partitions.get(rel_path)
+        if entry is None or entry["size"] != size or entry["mtime_ns"] != mtime_ns:
+            entry = {"size": size, "mtime_ns": mtime_ns}
+            match = PARTITION_PATTERN.search(rel_path)
+            if match:
+                entry["year"], entry["month"] = int(match.group(1)), int(match.group(2))
+            entry.update(scan_partition(os.path.join(root, rel_path)))
+            changed = True
+        partitions[rel_path] = entry
+    changed = changed or set(partitions) != set(old_partitions)
+
+    index = {"version": PARTITION_INDEX_VERSION, "partitions": partitions}
+    if changed:
+        index_path = os.path.join(root, PARTITION_INDEX_FILE)
+        try:
+            with open(index_path + ".tmp", "w") as f:
+                json.dump(index, f, indent=4)
+            os.replace(index_path + ".tmp", index_path)
+        except OSError:
+            pass
+    return index
+
+def partition_date_bounds(index):
+    """The overall (min, max) date covered by a partition index"""
+    entries = [e for e in index["partitions"].values() if e["rows"]]
+    if not entries:
+        return None, None
+    min_date = min(e["min_date"] for e in entries)
+    max_date = max(e["max_date"] for e in entries)
+    return pd.Timestamp(min_date).date(), pd.Timestamp(max_date).date()
+
+def select_partitions(index, start_date, end_date):
+    """Partitions whose date range overlaps [start_date, end_date]"""
+    start, end = start_date.isoformat(), end_date.isoformat()
+    return [
+        rel_path for rel_path, entry in index["partitions"].items()
+        if entry["rows"] and entry["min_date"] <= end and entry["max_date"] >= start
+    ]
+
+def load_partitions(root, rel_paths):
+    """Load and concatenate the given partitions, each through its own columnar store"""
+    frames = [load_sales_data(os.path.join(root, rel_path)) for rel_path in rel_paths]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    return concat_sales_frames(frames)
+
+def partition_signatures(index, rel_paths):
+    """The (size, mtime_ns) of each given partition, which together key their snapshot"""
+    return tuple((index["partitions"][p]["size"], index["partitions"][p]["mtime_ns"]) for p in rel_paths)
+
+def partition_snapshot(root, rel_paths, derive=None):
+    """A snapshot of the given partitions, loaded together"""
+    frame = load_partitions(root, rel_paths)
+    return build_snapshot(
+        frame, sales_topk.new_ranking(product_revenue_totals(frame)), None, derive, source=(root, rel_paths)
+    )
+
+# The watcher snapshots the partitions that cover every date, which is what
+# the default view reads, once per change to any of them. state["warm"] is
+# replaced whole and never mutated, so readers take it without locking
+def new_partition_state(derive=None):
+    """An empty record of the default view's partition snapshot; share one per directory across sessions"""
+    return {"lock": threading.Lock(), "derive": derive, "warm": None}
+
+def prewarm_partition_snapshot(root, state):
+    """Refresh the partition index and snapshot every partition with rows, unless none of them changed"""
+    with state["lock"]:
+        index = refresh_partition_index(root)
+        min_date, max_date = partition_date_bounds(index)
+        if min_date is None:
+            return state["warm"]
+        rel_paths = tuple(select_partitions(index, min_date, max_date))
+        key = (rel_paths, partition_signatures(index, rel_paths))
+        if state["warm"] is None or state["warm"]["key"] != key:
+            state["warm"] = {"key": key, "snapshot": partition_snapshot(root, rel_paths, state["derive"])}
+        return state["warm"]
+
+def prewarmed_partition_snapshot(state, rel_paths, signatures):
+    """The watcher's snapshot of exactly these partitions at these signatures, or None"""
+    warm = state["warm"]
+    if warm is None or warm["key"] != (tuple(rel_paths), tuple(signatures)):
+        return None
+    return warm["snapshot"]
+
+# -----------------------
+# SAMPLE DATA GENERATOR
+# -----------------------
+DEFAULT_REGIONS = ["North", "South", "East", "West", "Central"]
+DEFAULT_CATEGORIES = ["Electronics", "Clothing", "Home & Garden", "Sports", "Books"]
+DEFAULT_PRODUCTS = [
+    "Smartphone Pro", "Laptop Ultra", "Wireless Headphones", "Smart Watch", "Tablet",
+    "Designer Jeans", "Cotton T-Shirt", "Winter Jacket", "Running Shoes", "Formal Shirt",
+    "Garden Tools Set", "Plant Pots", "Outdoor Furniture", "BBQ Grill", "Lawn Mower",
+    "Football", "Tennis Racket", "Yoga Mat", "Dumbbells", "Bicycle",
+    "Programming Book", "Novel", "Cookbook", "Travel Guide", "Children Book"
+]
+DEFAULT_SALES_REPS = [
+    "Priya Sharma", "John Smith", "Sara Lee", "Ravi Kumar", "Alex Johnson", "Michael Brown"
+]
+GENERATOR_COLUMNS = ["Date", "Product", "Category", "Quantity", "Unit_Price", "Revenue", "Region", "Sales_Rep"]
+
+def _names(defaults, n, prefix):
+    """The first n default names, padded with numbered names when n is larger"""
+    return defaults[:n] + [f"{prefix} {i + 1:04d}" for i in range(len(defaults), n)]
+
+def iter_generated_sales(rows, seed=42, n_regions=5, n_products=25, n_sales_reps=6,
+                         n_categories=5, start_date="2023-01-01", end_date="2024-12-31",
+                         chunk_rows=1_000_000):
+    """Yield synthetic sales chunks as dictionary codes plus numeric arrays, in date order.
+
+    Output is reproducible for the same seed and chunk_rows.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start_date, end_date, freq="D")
+    labels = {
+        "Region": _names(DEFAULT_REGIONS, n_regions, "Region"),
+        "Category": _names(DEFAULT_CATEGORIES, n_categories, "Category"),
+        "Product": _names(DEFAULT_PRODUCTS, n_products, "Product"),
+        "Sales_Rep": _names(DEFAULT_SALES_REPS, n_sales_reps, "Rep")
+    }
+
+    # Seasonality: a yearly cycle peaking in late November, busier weekends
+    # and mild growth over the whole range
+    day_of_year = days.dayofyear.to_numpy()
+    season = 1 + 0.35 * np.cos(2 * np.pi * (day_of_year - 330) / 365.25)
+    weekend = np.where(days.dayofweek.to_numpy() >= 5, 1.25, 1.0)
+    growth = np.linspace(1.0, 1.2, len(days))
+    day_p = season * weekend * growth
+    day_p /= day_p.sum()
+
+    # Long-tailed product popularity, each product in one category at a fixed list price
+    product_p = 1 / np.arange(1, n_products + 1) ** 1.1
+    product_p /= product_p.sum()
+    product_category = (np.arange(n_products) * n_categories // n_products).astype(codes_dtype_for(n_categories))
+    list_price = np.rint(rng.lognormal(mean=7.0, sigma=1.0, size=n_products)).clip(50, None)
+    region_p = rng.dirichlet(np.full(n_regions, 5.0))
+    # Rows per day are drawn up front and handed out in day order, so every
+    # chunk holds a run of consecutive days and the output is sorted by Date
+    day_ends = np.cumsum(rng.multinomial(rows, day_p))
+
+    written = 0
+    while written < rows:
+        n = min(chunk_rows, rows - written)
+        first, last = np.searchsorted(day_ends, [written, written + n - 1], side="right")
+        span = np.arange(first, last + 1)
+        day_starts = np.concatenate(([0], day_ends[:-1]))[span]
+        day_rows = np.minimum(day_ends[span], written + n) - np.maximum(day_starts, written)
+        product = rng.choice(n_products, size=n, p=product_p).astype(codes_dtype_for(n_products))
+        quantity = np.minimum(rng.geometric(0.2, size=n), 100).astype(np.int16)
+        unit_price = np.rint(list_price[product] * rng.uniform(0.9, 1.1, size=n)).astype(np.int32)
+        yield {
+            "Date": np.repeat(span, day_rows),
+            "Product": product,
+            "Category": product_category[product],
+            "Quantity": quantity,
+            "Unit_Price": unit_price,
+            "Revenue": quantity.astype(np.int64) * unit_price,
+            "Region": rng.choice(n_regions, size=n, p=region_p).astype(codes_dtype_for(n_regions)),
+            "Sales_Rep": rng.integers(0, n_sales_reps, size=n).astype(codes_dtype_for(n_sales_reps))
+        }, labels, days
+        written += n
+
+def generate_sales_data(path, rows, fmt="csv", **options):
+    """Write a synthetic sales dataset as a CSV file or a columnar store directory"""
+    if fmt == "csv":
+        _write_generated_csv(path, rows, **options)
+    elif fmt == "columnar":
+        _write_generated_columnar(path, rows, **options)
+    else:
+        raise ValueError(f"unknown format '{fmt}', expected 'csv' or 'columnar'")
+
+def _write_generated_csv(path, rows, **options):
+    first = True
+    day_strings = None
+    for chunk, labels, days in iter_generated_sales(rows, **options):
+        if day_strings is None:
+            day_strings = days.strftime(DATE_FORMAT).to_numpy()
+        frame = pd.DataFrame({
+            name: day_strings[chunk[name]] if name == "Date"
+            else np.asarray(labels[name], dtype=object)[chunk[name]] if name in labels
+            else chunk[name]
+            for name in GENERATOR_COLUMNS
+        })
+        frame.to_csv(path, mode="w" if first else "a", header=first, index=False)
+        first = False
+
+def _write_generated_columnar(path, rows, **options):
+    data_dir = "data"
+    data_path = os.path.join(path, data_dir)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(data_path)
+
+    epoch_day = None
+    outputs = None
+    columns = []
+    start = 0
+    for chunk, labels, days in iter_generated_sales(rows, **options):
+        if outputs is None:
+            epoch_day = days[0].value // NS_PER_DAY
+            outputs = {}
+            for i, name in enumerate(GENERATOR_COLUMNS):
+                entry = {"name": name, "file": f"{i}.npy"}
+                dtype = np.int64 if name == "Date" else chunk[name].dtype
+                if name == "Date":
+                    entry.update(kind="datetime", unit="D")
+                elif name in labels:
+                    entry.update(kind="dictionary", labels=labels[name])
+                else:
+                    entry["kind"] = "numeric"
+                outputs[name] = np.lib.format.open_memmap(
+                    os.path.join(data_path, entry["file"]), mode="w+", dtype=dtype, shape=(rows,)
+                )
+                columns.append(entry)
+        n = len(chunk["Date"])
+        for name in GENERATOR_COLUMNS:
+            values = chunk[name] + epoch_day if name == "Date" else chunk[name]
+            outputs[name][start:start + n] = values
+        start += n
+
+    for values in (outputs or {}).values():
+        values.flush()
+    save_cache_meta(path, {
+        "version": CACHE_FORMAT_VERSION,
+        "size": None,
+        "mtime_ns": None,
+        "sha256": None,
+        "rows": rows,
+        "data_dir": data_dir,
+        "columns": columns
+    })
+
+def is_columnar_dataset(source):
+    """Whether a sales source is a columnar dataset directory rather than a CSV or partitions"""
+    return os.path.isfile(os.path.join(source, CACHE_META_FILE))
+
+def open_columnar_dataset(path):
+    """Map a columnar dataset directory written by generate_sales_data"""
+    meta = load_cache_meta(path)
+    if meta is None:
+        raise OSError(f"'{path}' is not a columnar sales dataset")
+    return open_columnar_store(path, meta)
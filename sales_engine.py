@@ -0,0 +1,1130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import sales_data
+import sales_index
+import sales_search
+import sales_table
+import sales_topk
+
+# -----------------------
+# CONFIG
+# -----------------------
+# Memory the streaming engine may use for one parsed chunk, in megabytes
+MEMORY_BUDGET_MB = int(os.getenv("SALES_MEMORY_BUDGET_MB", "512"))
+
+# Parsed frames need headroom for filter masks and groupby intermediates
+CHUNK_HEADROOM = 4
+SAMPLE_ROWS = 1000
+
+# Products offered (and pre-selected) in the sidebar
+TOP_PRODUCT_OPTIONS = 20
+
+# Toggles of at most this many values are patched into the previous result;
+# after this many patches in a row the result is recomputed to shed float drift
+DELTA_MAX_VALUES = 3
+DELTA_MAX_CHAIN = 20
+
+# Per-value prefix sums are kept for a dimension only while values x days stays
+# under this many entries (three measures each)
+PREFIX_MAX_CELLS = 5_000_000
+
+# Memory for computed KPIs and chart frames shared by every session, in megabytes
+RESULT_CACHE_MB = float(os.getenv("SALES_RESULT_CACHE_MB", "64"))
+
+# Approximate mode estimates from a sample stratified by Region x Category and
+# refines it through these sample sizes, stopping once the revenue interval is
+# within APPROX_TARGET of the estimate or the next size would overrun APPROX_BUDGET_MS
+APPROX_STRATA = ["Region", "Category"]
+APPROX_LEVELS = [10_000, 100_000, 1_000_000]
+APPROX_TARGET = float(os.getenv("SALES_APPROX_TARGET", "0.01"))
+APPROX_BUDGET_MS = float(os.getenv("SALES_APPROX_BUDGET_MS", "100"))
+# Each stratum keeps at least this many sampled rows (or all of its rows)
+APPROX_MIN_STRATUM_ROWS = 30
+APPROX_Z = 1.96  # 95% confidence intervals
+APPROX_SEED = 7
+
+# The revenue trend can be bucketed by any of these; "auto" picks the finest
+# that keeps the chart within TREND_MAX_POINTS points
+GRANULARITIES = ["day", "week", "month", "quarter"]
+DEFAULT_GRANULARITY = "month"
+TREND_MAX_POINTS = 36
+
+WEEKDAY_NAMES = {
+    0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday",
+    4: "Friday", 5: "Saturday", 6: "Sunday"
+}
+
+# -----------------------
+# FILTERS
+# -----------------------
+def filter_mask(df, filters):
+    """Boolean Series of the rows matching the sidebar filters (any of which may be None)"""
+    mask = pd.Series(True, index=df.index)
+    if not filters:
+        return mask
+    if filters.get("regions") is not None:
+        mask &= df["Region"].isin(filters["regions"])
+    if filters.get("categories") is not None:
+        mask &= df["Category"].isin(filters["categories"])
+    if filters.get("products") is not None:
+        mask &= df["Product"].isin(filters["products"])
+    # Compare timestamps directly; .dt.date would build a Python date per row
+    if filters.get("start_date") is not None:
+        mask &= df["Date"] >= pd.Timestamp(filters["start_date"])
+    if filters.get("end_date") is not None:
+        mask &= df["Date"] < pd.Timestamp(filters["end_date"]) + pd.Timedelta(days=1)
+    return mask
+
+def apply_filters(df, filters):
+    """Apply the sidebar filters (any of which may be None) to a frame"""
+    if not filters:
+        return df
+    return df[filter_mask(df, filters)]
+
+def filter_rows(df, filters, date_index, bitmaps=None):
+    """apply_filters on a date-sorted frame: slice out the date range, then filter dimensions inside it"""
+    if not filters:
+        return df
+    start, stop = sales_index.date_slice(date_index, filters.get("start_date"), filters.get("end_date"))
+    if bitmaps is None:
+        dimensions = {key: filters.get(key) for key in ("regions", "categories", "products")}
+        return apply_filters(df.iloc[start:stop], dimensions)
+    rows = sales_index.select_dimension_rows(bitmaps, filters, start, stop)
+    return df.iloc[start:stop] if rows is None else df.take(rows)
+
+def filter_row_ids(filters, date_index, bitmaps):
+    """The sorted row ids filter_rows keeps from the date-sorted frame the indexes were built over"""
+    start, stop = sales_index.date_slice(date_index, filters.get("start_date"), filters.get("end_date"))
+    rows = sales_index.select_dimension_rows(bitmaps, filters, start, stop)
+    return np.arange(start, stop, dtype=np.int64) if rows is None else rows
+
+# -----------------------
+# PERIODS
+# -----------------------
+def weekday_numbers(days):
+    """pandas dayofweek (Monday = 0) of datetime64[D] values"""
+    # 1970-01-01 was a Thursday
+    return (days.view(np.int64) + 3) % 7
+
+def period_starts(days, granularity):
+    """The first day of the day, week (from Monday), month or quarter holding each datetime64[D] value"""
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        return days - weekday_numbers(days).astype("timedelta64[D]")
+    months = days.astype("datetime64[M]")
+    if granularity == "quarter":
+        months = months - (months.view(np.int64) % 3).astype("timedelta64[M]")
+    return months.astype("datetime64[D]")
+
+def next_period_starts(starts, granularity):
+    """The first day of the period after each period start"""
+    if granularity in ("day", "week"):
+        return starts + np.timedelta64(1 if granularity == "day" else 7, "D")
+    step = 3 if granularity == "quarter" else 1
+    return (starts.astype("datetime64[M]") + np.timedelta64(step, "M")).astype("datetime64[D]")
+
+def period_labels(starts, granularity):
+    """Chart labels for period starts: 2024-03-05, week of 2024-03-04, 2024-03, 2024Q1"""
+    index = pd.DatetimeIndex(starts.astype("datetime64[ns]"))
+    if granularity in ("day", "week"):
+        return index.strftime("%Y-%m-%d")
+    return index.to_period("Q" if granularity == "quarter" else "M").astype(str)
+
+def choose_granularity(start_date, end_date, max_points=TREND_MAX_POINTS):
+    """The finest trend granularity that shows the date range in at most max_points periods"""
+    days = np.arange(np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + 1)
+    for granularity in GRANULARITIES[:-1]:
+        if len(np.unique(period_starts(days, granularity))) <= max_points:
+            return granularity
+    return GRANULARITIES[-1]
+
+# -----------------------
+# PARTIAL AGGREGATES
+# -----------------------
+# One pass: Date is reduced to a day number once and each dimension's
+# dictionary codes are read once. Every sum sharing a key is a bincount over
+# those codes, and weekday sums are rolled up from the per-day sums (a few
+# hundred entries) instead of being recomputed over every row. The per-day sums
+# are kept so the trend can be bucketed by day, week, month or quarter later
+def _weights(series):
+    """A numeric column as float64 bincount weights, and whether its sums are integers"""
+    values = series.to_numpy()
+    integral = values.dtype.kind in "iub"
+    values = values.astype(np.float64)
+    if not integral:
+        # pandas sums skip NaN
+        values = np.where(np.isnan(values), 0.0, values)
+    return values, integral
+
+def _sums(keys, weights, size):
+    """Per-key sums, kept integral when the column was (float64 is exact below 2**53)"""
+    values, integral = weights
+    totals = np.bincount(keys, weights=values, minlength=size)
+    return totals.astype(np.int64) if integral else totals
+
+def _group_codes(column):
+    """Dictionary codes and string labels of a dimension column; -1 marks a missing value"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories.astype(str)
+    codes, labels = pd.factorize(column)
+    return codes, pd.Index(labels).astype(str)
+
+def _by_dimension(column, *weights):
+    """Sums of each weight per observed value of a dimension, as Series with a plain string index"""
+    codes, labels = _group_codes(column)
+    valid = codes >= 0
+    if not valid.all():
+        codes = codes[valid]
+        weights = [(values[valid], integral) for values, integral in weights]
+    present = np.bincount(codes, minlength=len(labels)) > 0
+    index = labels[present]
+    return [pd.Series(_sums(codes, w, len(labels))[present], index=index) for w in weights]
+
+def _roll_up(keys, day_sums, present):
+    """Sum per-day totals into coarser keys (weekday, month), keeping only keys with rows"""
+    size = int(keys.max()) + 1 if len(keys) else 0
+    totals = [_sums(keys, (values, integral), size) for values, integral in day_sums]
+    observed = np.flatnonzero(np.bincount(keys, weights=present, minlength=size))
+    return observed, [t[observed] for t in totals]
+
+def partial_aggregates(df):
+    """Additive sums behind every dashboard KPI and chart for one frame, chunk or set of cube or rollup cells"""
+    dates = df["Date"].to_numpy()
+    day_numbers = dates.view(np.int64) // sales_data.NS_PER_DAY
+    first_day = int(day_numbers.min()) if len(df) else 0
+    day_keys = day_numbers - first_day
+
+    revenue = _weights(df["Revenue"])
+    quantity = _weights(df["Quantity"])
+    if "Orders" in df.columns:
+        # Cube cells: each one stands for Orders rows
+        orders = _weights(df["Orders"])
+    elif revenue[1]:
+        orders = np.ones(len(df)), True
+    else:
+        # Rows with a revenue, as pandas count() would report them
+        orders = (~np.isnan(df["Revenue"].to_numpy(dtype=np.float64))).astype(np.float64), True
+
+    n_days = int(day_keys.max()) + 1 if len(df) else 0
+    day_sums = [(np.bincount(day_keys, weights=w[0], minlength=n_days), w[1]) for w in (revenue, quantity, orders)]
+    day_present = (np.bincount(day_keys, minlength=n_days) > 0).astype(np.float64)
+
+    span = np.arange(first_day, first_day + n_days).astype("datetime64[D]")
+    if "Weekday" in df.columns:
+        # Rollup cells: Date is the start of a longer period, so each cell
+        # carries the weekday its rows fell on
+        weekday_keys = df["Weekday"].to_numpy().astype(np.int64)
+        weekdays = np.flatnonzero(np.bincount(weekday_keys, minlength=7))
+        weekday_revenue, weekday_quantity, weekday_count = (
+            _sums(weekday_keys, w, 7)[weekdays] for w in (revenue, quantity, orders)
+        )
+    else:
+        weekdays, (weekday_revenue, weekday_quantity, weekday_count) = _roll_up(
+            weekday_numbers(span), day_sums, day_present
+        )
+    days = np.flatnonzero(day_present)
+    day_index = pd.DatetimeIndex(span[days].astype("datetime64[ns]"))
+    day_revenue, day_orders = (
+        pd.Series(values[days].astype(np.int64) if integral else values[days], index=day_index)
+        for values, integral in (day_sums[0], day_sums[2])
+    )
+
+    product_revenue, product_orders = _by_dimension(df["Product"], revenue, orders)
+    category_revenue, category_orders = _by_dimension(df["Category"], revenue, orders)
+    region_revenue, region_quantity, region_orders = _by_dimension(df["Region"], revenue, quantity, orders)
+    return {
+        "rows": int(weekday_count.sum()) if "Orders" in df.columns else len(df),
+        "total_revenue": weekday_revenue.sum(),
+        "total_quantity": weekday_quantity.sum(),
+        "min_date": pd.Timestamp(dates.min()) if len(df) else None,
+        "max_date": pd.Timestamp(dates.max()) if len(df) else None,
+        "product_revenue": product_revenue,
+        "day_revenue": day_revenue,
+        "category_revenue": category_revenue,
+        "region_revenue": region_revenue,
+        "region_quantity": region_quantity,
+        "weekday_revenue": pd.Series(weekday_revenue, index=weekdays),
+        "weekday_count": pd.Series(weekday_count, index=weekdays),
+        "product_orders": product_orders,
+        "day_orders": day_orders,
+        "category_orders": category_orders,
+        "region_orders": region_orders
+    }
+
+def merge_partials(a, b):
+    """Combine the partial aggregates of two disjoint sets of rows"""
+    merged = {}
+    for key, value in a.items():
+        other = b[key]
+        if isinstance(value, pd.Series):
+            # Keys missing on one side are filled with 0; keep integer sums integral
+            dtype = np.result_type(value.dtype, other.dtype)
+            merged[key] = value.add(other, fill_value=0).astype(dtype)
+        elif key in ("min_date", "max_date"):
+            present = [v for v in (value, other) if v is not None]
+            pick = min if key == "min_date" else max
+            merged[key] = pick(present) if present else None
+        else:
+            merged[key] = value + other
+    return merged
+
+# Each keyed sum and the order count that says whether its keys still have rows
+ORDER_COUNTS = {
+    "product_revenue": "product_orders",
+    "day_revenue": "day_orders",
+    "category_revenue": "category_orders",
+    "region_revenue": "region_orders",
+    "region_quantity": "region_orders",
+    "weekday_revenue": "weekday_count"
+}
+
+def subtract_partials(a, b):
+    """Remove the partial aggregates of a subset of rows from those of the whole"""
+    result = {}
+    for key, value in a.items():
+        other = b[key]
+        if isinstance(value, pd.Series):
+            dtype = np.result_type(value.dtype, other.dtype)
+            result[key] = value.sub(other, fill_value=0).astype(dtype)
+        elif key in ("min_date", "max_date"):
+            # Still a bound on the remaining rows, if not a tight one
+            result[key] = value
+        else:
+            result[key] = value - other
+    # Keys left without rows disappear, as they would from a groupby
+    for key, count_key in ORDER_COUNTS.items():
+        result[key] = result[key][result[count_key].reindex(result[key].index, fill_value=0) > 0]
+    for count_key in set(ORDER_COUNTS.values()):
+        result[count_key] = result[count_key][result[count_key] > 0]
+    if result["rows"] == 0:
+        result["total_revenue"] = result["total_quantity"] = 0
+    return result
+
+def trend_series(day_revenue, granularity):
+    """Per-day revenue summed per period, indexed by period start"""
+    starts = period_starts(day_revenue.index.to_numpy().astype("datetime64[D]"), granularity)
+    return day_revenue.groupby(starts).sum()
+
+def finalize_aggregates(partials, granularity=DEFAULT_GRANULARITY):
+    """Turn partial sums into the KPI values and chart frames the dashboard renders, with the trend bucketed by granularity"""
+    rows = partials["rows"]
+
+    top_products = sales_topk.heaviest(partials["product_revenue"], 10)
+    trend = trend_series(partials["day_revenue"], granularity)
+    region = partials["region_revenue"].sort_index()
+    weekday_mean = (partials["weekday_revenue"] / partials["weekday_count"]).sort_index()
+
+    weekly_data = weekday_mean.rename_axis("Date").rename("Revenue").reset_index()
+    weekly_data["Day"] = weekly_data["Date"].map(WEEKDAY_NAMES)
+
+    return {
+        "total_revenue": partials["total_revenue"],
+        "total_quantity": partials["total_quantity"],
+        "avg_order_value": partials["total_revenue"] / rows if rows else float("nan"),
+        "total_orders": rows,
+        "top_products": top_products.rename_axis("Product").rename("Revenue").reset_index(),
+        "trend": pd.DataFrame({"Date": period_labels(trend.index.to_numpy(), granularity), "Revenue": trend.to_numpy()}),
+        "category": partials["category_revenue"].sort_index().rename_axis("Category").rename("Revenue").reset_index(),
+        "region": region.rename_axis("Region").rename("Revenue").reset_index().sort_values("Revenue", ascending=True, kind="stable"),
+        "region_quantity": partials["region_quantity"].sort_index().rename_axis("Region").rename("Quantity").reset_index(),
+        "weekday": weekly_data
+    }
+
+def compute_aggregates(df):
+    """Compute every dashboard KPI and chart frame from an in-memory selection"""
+    return finalize_aggregates(partial_aggregates(df))
+
+# -----------------------
+# CUBE
+# -----------------------
+# Every chart groups by a day-level function of Date (month, weekday) and/or one
+# of these dimensions, so summing rows into (day, region, category, product)
+# cells loses nothing. Cells keep the frame's column names, so apply_filters and
+# partial_aggregates work on a cube unchanged and cost scales with cells, not rows
+CUBE_DIMENSIONS = ["Region", "Category", "Product"]
+CUBE_MEASURES = ["Revenue", "Quantity", "Orders"]
+
+def build_cube(frame):
+    """Sum Revenue and Quantity and count orders per (day, region, category, product) cell"""
+    keys = [frame["Date"].dt.floor("D")] + [frame[name] for name in CUBE_DIMENSIONS]
+    cube = frame.groupby(keys, observed=True, dropna=False, sort=False).agg(
+        Revenue=("Revenue", "sum"),
+        Quantity=("Quantity", "sum"),
+        Orders=("Revenue", "size")
+    )
+    return sales_data.sort_by_date(cube.reset_index())
+
+def append_cells(cells, tail_cells, keys):
+    """Add the cells of later rows to date-sorted cells, summing cells with equal keys; returns (cells, first changed row)"""
+    if len(tail_cells) == 0:
+        return cells, len(cells)
+    # Only cells on or after the tail's first date can share its keys
+    cut = int(np.searchsorted(cells["Date"].to_numpy(), tail_cells["Date"].to_numpy()[0]))
+    overlap = sales_data.concat_sales_frames([cells.iloc[cut:], tail_cells])
+    merged = overlap.groupby(keys, observed=True, dropna=False, sort=False)[CUBE_MEASURES].sum()
+    merged = sales_data.sort_by_date(merged.reset_index())
+    return sales_data.concat_sales_frames([cells.iloc[:cut], merged]), cut
+
+# -----------------------
+# ROLLUPS
+# -----------------------
+# Month and quarter rollups sum the day cube's cells per (period, weekday,
+# region, category, product), with Date holding the period start. A query
+# covers its date range with whole periods of the coarsest rollup that still
+# buckets into the trend granularity and reads day cells only for the partial
+# periods at either end. Weeks come from day cells: split by weekday, as the
+# weekday chart needs, a week rollup would be as large as the day cube
+ROLLUP_CHAINS = {
+    "day": ["day"],
+    "week": ["day"],
+    "month": ["month", "day"],
+    "quarter": ["quarter", "month", "day"]
+}
+
+def build_rollup(cube, granularity):
+    """Sum day cells into (period start, weekday, region, category, product) cells"""
+    days = cube["Date"].to_numpy().astype("datetime64[D]")
+    keys = [
+        pd.Series(period_starts(days, granularity).astype("datetime64[ns]"), name="Date"),
+        pd.Series(weekday_numbers(days).astype(np.int8), name="Weekday")
+    ] + [cube[name] for name in CUBE_DIMENSIONS]
+    rollup = cube.groupby(keys, observed=True, dropna=False, sort=False)[["Revenue", "Quantity", "Orders"]].sum()
+    return sales_data.sort_by_date(rollup.reset_index())
+
+def build_rollups(cube):
+    """The day cube and its month and quarter rollups, each with its own date and bitmap indexes"""
+    rollups = {}
+    for granularity in ("day", "month", "quarter"):
+        cells = cube if granularity == "day" else build_rollup(cube, granularity)
+        rollups[granularity] = {
+            "cells": cells,
+            "date_index": sales_index.build_date_index(cells["Date"]),
+            "bitmaps": sales_index.build_bitmap_indexes(cells)
+        }
+    return rollups
+
+def extend_rollups(rollups, cube, cut, tail_cube):
+    """The rollups of a cube whose cells from cut on changed when the cells of tail_cube were appended"""
+    extended = {}
+    for granularity, rollup in rollups.items():
+        if granularity == "day":
+            cells, first = cube, cut
+        else:
+            cells, first = append_cells(
+                rollup["cells"], build_rollup(tail_cube, granularity), ["Date", "Weekday"] + CUBE_DIMENSIONS
+            )
+        extended[granularity] = {
+            "cells": cells,
+            "date_index": sales_index.build_date_index(cells["Date"]),
+            "bitmaps": sales_index.extend_bitmap_indexes(rollup["bitmaps"], cells, first)
+        }
+    return extended
+
+def rollup_pieces(start, stop, chain):
+    """Cover the days [start, stop) with (rollup, first day, stop day) runs: whole periods of chain[0], finer rollups at the edges"""
+    if start >= stop:
+        return []
+    granularity, finer = chain[0], chain[1:]
+    if not finer:
+        return [(granularity, start, stop)]
+    first = period_starts(np.array([start]), granularity)[0]
+    if first < start:
+        first = next_period_starts(np.array([first]), granularity)[0]
+    last = period_starts(np.array([stop]), granularity)[0]
+    if first >= last:
+        return rollup_pieces(start, stop, finer)
+    return rollup_pieces(start, first, finer) + [(granularity, first, last)] + rollup_pieces(last, stop, finer)
+
+def rollup_partials(snapshot, filters):
+    """Partial aggregates for the filters from the coarsest rollups their trend granularity allows"""
+    filters = filters or {}
+    min_day = np.datetime64(snapshot["min_date"], "D")
+    max_day = np.datetime64(snapshot["max_date"], "D")
+    start = min_day if filters.get("start_date") is None else np.datetime64(filters["start_date"], "D")
+    stop = max_day + 1 if filters.get("end_date") is None else np.datetime64(filters["end_date"], "D") + 1
+    # No cells lie outside the data, so a range reaching past either end may
+    # be widened to whole quarters there
+    if start <= min_day:
+        start = period_starts(np.array([min_day]), "quarter")[0]
+    if stop > max_day:
+        stop = next_period_starts(period_starts(np.array([max_day]), "quarter"), "quarter")[0]
+
+    partials = None
+    chain = ROLLUP_CHAINS[filters.get("granularity", DEFAULT_GRANULARITY)]
+    for granularity, first, stop_day in rollup_pieces(start, stop, chain):
+        rollup = snapshot["rollups"][granularity]
+        piece = {**filters, "start_date": first, "end_date": stop_day - 1}
+        piece_partials = partial_aggregates(filter_rows(rollup["cells"], piece, rollup["date_index"], rollup["bitmaps"]))
+        partials = piece_partials if partials is None else merge_partials(partials, piece_partials)
+    if partials is None:
+        partials = partial_aggregates(snapshot["cube"].iloc[:0])
+    return partials
+
+# -----------------------
+# RESULT CACHE
+# -----------------------
+# One process-wide LRU of finalized aggregates, keyed on the dataset they were
+# computed from and the canonical filters, so sessions share each other's work.
+# Datasets read from the same source are ordered: the newest one seen is
+# current, every older one's results are dropped, and a session still reading
+# an older one computes without caching
+def new_result_cache(budget_mb=RESULT_CACHE_MB):
+    """Create an empty result cache holding at most budget_mb of aggregates"""
+    return {
+        "lock": threading.Lock(),
+        "entries": OrderedDict(),
+        "bytes": 0,
+        "budget": int(budget_mb * 1024 * 1024),
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "current": {}
+    }
+
+RESULT_CACHE = new_result_cache()
+
+def canonical_filters(filters):
+    """A hashable key that ignores selection order: (start, end, regions, categories, products, granularity)"""
+    filters = filters or {}
+    def values(key):
+        selected = filters.get(key)
+        return None if selected is None else tuple(sorted(str(v) for v in selected))
+    def day(key):
+        d = filters.get(key)
+        return None if d is None else pd.Timestamp(d).date().isoformat()
+    return (
+        day("start_date"), day("end_date"), values("regions"), values("categories"), values("products"),
+        filters.get("granularity")
+    )
+
+def aggregates_bytes(aggregates):
+    """Approximate memory held by finalized aggregates"""
+    return sum(
+        int(v.memory_usage(deep=True).sum()) if isinstance(v, pd.DataFrame) else 32
+        for v in aggregates.values()
+    )
+
+def _drop_entry(cache, key):
+    _, size = cache["entries"].pop(key)
+    cache["bytes"] -= size
+
+def _make_current(cache, source, dataset):
+    """Record dataset as its source's current one, dropping results of every other; False when a newer one is current"""
+    current = cache["current"].get(source)
+    if current is not None and dataset <= current:
+        return dataset == current
+    cache["current"][source] = dataset
+    for key in [k for k in cache["entries"] if k[0] == source and k[1] != dataset]:
+        _drop_entry(cache, key)
+    return True
+
+def cached_aggregates(dataset, filters, compute, cache=RESULT_CACHE, source=None):
+    """Return the aggregates for (dataset, filters), calling compute() and storing them on a miss; datasets of one source must increase as it changes"""
+    key = (source, dataset, canonical_filters(filters))
+    with cache["lock"]:
+        if source is not None and not _make_current(cache, source, dataset):
+            cache["misses"] += 1
+            return compute()
+        entry = cache["entries"].get(key)
+        if entry is not None:
+            cache["entries"].move_to_end(key)
+            cache["hits"] += 1
+            return entry[0]
+        cache["misses"] += 1
+
+    # Computed outside the lock; two sessions missing together both compute
+    aggregates = compute()
+    size = aggregates_bytes(aggregates)
+    with cache["lock"]:
+        stale = source is not None and cache["current"].get(source) != dataset
+        if size <= cache["budget"] and key not in cache["entries"] and not stale:
+            cache["entries"][key] = (aggregates, size)
+            cache["bytes"] += size
+            while cache["bytes"] > cache["budget"]:
+                _drop_entry(cache, next(iter(cache["entries"])))
+                cache["evictions"] += 1
+    return aggregates
+
+def result_cache_stats(cache=RESULT_CACHE):
+    """Hit/miss counters and current usage of a result cache"""
+    with cache["lock"]:
+        lookups = cache["hits"] + cache["misses"]
+        return {
+            "entries": len(cache["entries"]),
+            "mb": cache["bytes"] / (1024 * 1024),
+            "budget_mb": cache["budget"] / (1024 * 1024),
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "hit_rate": cache["hits"] / lookups if lookups else 0.0,
+            "evictions": cache["evictions"]
+        }
+
+# -----------------------
+# DELTA RE-AGGREGATION
+# -----------------------
+# Toggling a value or two in one multiselect changes only that slice of rows.
+# The previous selection's partials are patched by subtracting the slice that
+# left and adding the slice that joined, instead of re-aggregating everything
+def filter_delta(old, new):
+    """(filter key, removed values, added values) when only one dimension filter differs, else None"""
+    keys = ("start_date", "end_date", "granularity", "regions", "categories", "products")
+    changed = [key for key in keys if old.get(key) != new.get(key)]
+    if len(changed) != 1 or changed[0] in ("start_date", "end_date", "granularity"):
+        return None
+    key = changed[0]
+    if old.get(key) is None or new.get(key) is None:
+        return None
+    before, after = set(old[key]), set(new[key])
+    return key, sorted(before - after), sorted(after - before)
+
+def delta_partials(base_partials, base_filters, filters, slice_partials):
+    """Patch base_partials (for base_filters) into the partials for filters, or None when a full recompute is cheaper"""
+    delta = filter_delta(base_filters, filters)
+    if delta is None:
+        return None
+    key, removed, added = delta
+    changed = len(removed) + len(added)
+    if changed > DELTA_MAX_VALUES or changed >= len(filters[key]):
+        return None
+    partials = base_partials
+    if removed:
+        partials = subtract_partials(partials, slice_partials({**base_filters, key: removed}))
+    if added:
+        partials = merge_partials(partials, slice_partials({**filters, key: added}))
+    return partials
+
+def snapshot_partials(snapshot, filters, session=None):
+    """Partial aggregates for the filters, patched from the session's last ones when only a few values were toggled"""
+    slice_partials = lambda f: rollup_partials(snapshot, f)
+    base = session.get("delta_base") if session is not None else None
+    if base is None or base["dataset"] != snapshot["id"]:
+        base = {"dataset": snapshot["id"], "filters": snapshot["default_filters"],
+                "partials": snapshot["default_partials"], "depth": 0}
+
+    partials = None
+    if base["depth"] < DELTA_MAX_CHAIN:
+        partials = delta_partials(base["partials"], base["filters"], filters, slice_partials)
+    depth = base["depth"] + 1
+    if partials is None:
+        partials = slice_partials(filters)
+        depth = 0
+    if session is not None:
+        session["delta_base"] = {"dataset": snapshot["id"], "filters": filters, "partials": partials, "depth": depth}
+    return partials
+
+# -----------------------
+# PREFIX SUMS
+# -----------------------
+# prefix[i] holds the totals of every day before origin + i, so any date range's
+# total is prefix[stop] - prefix[start]. Per-value tables do the same for each
+# value of a dimension, which answers a selection in that one dimension with a
+# difference per selected value instead of a pass over the rows
+PREFIX_MEASURES = ["Revenue", "Quantity", "Orders"]
+KPI_KEYS = ["total_revenue", "total_quantity", "avg_order_value", "total_orders"]
+
+def _cumulative(day_totals, integral):
+    """Prefix sums along the last axis with a leading zero"""
+    totals = day_totals.astype(np.int64) if integral else day_totals
+    pad = [(0, 0)] * (totals.ndim - 1) + [(1, 0)]
+    return np.pad(np.cumsum(totals, axis=-1), pad)
+
+def build_prefix_sums(cube, dimensions=CUBE_DIMENSIONS, max_cells=PREFIX_MAX_CELLS):
+    """Per-day prefix sums of every measure, overall and per value of each small enough dimension"""
+    days = cube["Date"].to_numpy().astype("datetime64[D]")
+    origin = days.min() if len(days) else None
+    day_keys = (days - origin).astype(np.int64) if len(days) else np.empty(0, dtype=np.int64)
+    n_days = int(day_keys.max()) + 1 if len(days) else 0
+    weights = {name: _weights(cube[name]) for name in PREFIX_MEASURES}
+
+    prefix = {
+        "origin": origin,
+        "days": n_days,
+        "overall": {
+            name: _cumulative(np.bincount(day_keys, weights=values, minlength=n_days), integral)
+            for name, (values, integral) in weights.items()
+        },
+        "dimensions": {}
+    }
+    for dimension in dimensions:
+        codes, labels = _group_codes(cube[dimension])
+        if len(labels) * n_days > max_cells:
+            continue
+        valid = codes >= 0
+        keys = codes[valid].astype(np.int64) * n_days + day_keys[valid]
+        prefix["dimensions"][dimension] = {
+            "labels": {label: i for i, label in enumerate(labels)},
+            # With missing values, "every label" is not "every row"
+            "complete": bool(valid.all()),
+            "sums": {
+                name: _cumulative(
+                    np.bincount(keys, weights=values[valid], minlength=len(labels) * n_days).reshape(len(labels), n_days),
+                    integral
+                )
+                for name, (values, integral) in weights.items()
+            }
+        }
+    return prefix
+
+def extend_prefix_sums(prefix, tail_cube, max_cells=PREFIX_MAX_CELLS):
+    """Prefix sums with the cells of later rows added; days before the previous last day keep their sums"""
+    if prefix["origin"] is None:
+        return build_prefix_sums(tail_cube, max_cells=max_cells)
+    if len(tail_cube) == 0:
+        return prefix
+    # Later rows start on or after the last summed day, so only sums from
+    # there on change: each grows by the running total of the new cells
+    first = prefix["days"] - 1
+    day_keys = (tail_cube["Date"].to_numpy().astype("datetime64[D]") - prefix["origin"]).astype(np.int64) - first
+    span = int(day_keys.max()) + 1
+    n_days = first + span
+    weights = {name: _weights(tail_cube[name]) for name in PREFIX_MEASURES}
+
+    def extend(sums, totals, integral):
+        return np.concatenate([sums[..., :first + 1], sums[..., first + 1:] + _cumulative(totals, integral)[..., 1:]], axis=-1)
+
+    extended = {
+        "origin": prefix["origin"],
+        "days": n_days,
+        "overall": {
+            name: extend(prefix["overall"][name], np.bincount(day_keys, weights=values, minlength=span), integral)
+            for name, (values, integral) in weights.items()
+        },
+        "dimensions": {}
+    }
+    for dimension, table in prefix["dimensions"].items():
+        codes, labels = _group_codes(tail_cube[dimension])
+        positions = dict(table["labels"])
+        for label in labels:
+            positions.setdefault(label, len(positions))
+        if len(positions) * n_days > max_cells:
+            continue
+        mapping = np.append(np.array([positions[label] for label in labels], dtype=np.int64), -1)
+        codes = mapping[codes]
+        valid = codes >= 0
+        keys = codes[valid] * span + day_keys[valid]
+        added = len(positions) - len(table["labels"])
+        extended["dimensions"][dimension] = {
+            "labels": positions,
+            "complete": table["complete"] and bool(valid.all()),
+            "sums": {
+                name: extend(
+                    np.pad(table["sums"][name], [(0, added), (0, 0)]),
+                    np.bincount(keys, weights=values[valid], minlength=len(positions) * span).reshape(len(positions), span),
+                    integral
+                )
+                for name, (values, integral) in weights.items()
+            }
+        }
+    return extended
+
+def prefix_kpis(prefix, filters):
+    """The KPI card values for the filters from prefix sums, or None when they cannot answer them"""
+    filters = filters or {}
+    restricted = []
+    for dimension, key in (("Region", "regions"), ("Category", "categories"), ("Product", "products")):
+        selected = filters.get(key)
+        if selected is None:
+            continue
+        table = prefix["dimensions"].get(dimension)
+        if table is None:
+            return None
+        if table["complete"] and set(map(str, selected)) >= table["labels"].keys():
+            continue
+        restricted.append((table, selected))
+    # Sums per value cannot express an intersection of two dimensions
+    if len(restricted) > 1:
+        return None
+
+    if prefix["origin"] is None:
+        start = stop = 0
+    else:
+        def day_position(day, default):
+            if day is None:
+                return default
+            return min(max(int((np.datetime64(day, "D") - prefix["origin"]).astype(np.int64)), 0), prefix["days"])
+        start = day_position(filters.get("start_date"), 0)
+        stop = day_position(None if filters.get("end_date") is None else np.datetime64(filters["end_date"], "D") + 1, prefix["days"])
+        stop = max(start, stop)
+
+    if restricted:
+        table, selected = restricted[0]
+        rows = [table["labels"][v] for v in dict.fromkeys(map(str, selected)) if v in table["labels"]]
+        sums = {name: values[rows, stop].sum() - values[rows, start].sum() for name, values in table["sums"].items()}
+    else:
+        sums = {name: values[stop] - values[start] for name, values in prefix["overall"].items()}
+
+    orders = int(sums["Orders"])
+    return {
+        "total_revenue": sums["Revenue"] if orders else 0,
+        "total_quantity": sums["Quantity"] if orders else 0,
+        "avg_order_value": sums["Revenue"] / orders if orders else float("nan"),
+        "total_orders": orders
+    }
+
+# -----------------------
+# SNAPSHOT WARMING
+# -----------------------
+def derive_snapshot(snapshot, previous=None):
+    """Sidebar options, the cube, its rollups, indexes, prefix sums, search index, table cache and the default view's aggregates, built before a snapshot is published"""
+    frame = snapshot["frame"]
+    if previous is None:
+        derived = _derive_all(frame)
+        options = {key: frame[name].dropna().unique() for key, name in (("regions", "Region"), ("categories", "Category"))}
+    else:
+        derived = _derive_appended(previous, frame)
+        tail = frame.iloc[previous["rows"]:]
+        options = {
+            key: set(previous["default_filters"][key]).union(tail[name].dropna().unique())
+            for key, name in (("regions", "Region"), ("categories", "Category"))
+        }
+    min_date, max_date = derived["min_date"], derived["max_date"]
+    filters = {
+        "regions": sorted(options["regions"]),
+        "categories": sorted(options["categories"]),
+        "products": sales_topk.top_keys(snapshot["product_ranking"], TOP_PRODUCT_OPTIONS),
+        "start_date": min_date,
+        "end_date": max_date,
+        "granularity": choose_granularity(min_date, max_date)
+    }
+    default_partials = rollup_partials(derived, filters)
+    return {
+        **derived,
+        "default_filters": filters,
+        "default_rows": filter_row_ids(filters, derived["date_index"], derived["bitmaps"]),
+        "default_partials": default_partials,
+        "default_aggregates": finalize_aggregates(default_partials, filters["granularity"])
+    }
+
+def _derive_all(frame):
+    """Everything derive_snapshot builds from the rows, built from scratch"""
+    cube = build_cube(frame)
+    derived = {
+        "min_date": frame["Date"].min().date(),
+        "max_date": frame["Date"].max().date(),
+        "grand_total_revenue": frame["Revenue"].sum(),
+        "cube": cube,
+        "rollups": build_rollups(cube),
+        "date_index": sales_index.build_date_index(frame["Date"]),
+        "bitmaps": sales_index.build_bitmap_indexes(frame),
+        "prefix_sums": build_prefix_sums(cube)
+    }
+    derived["search_index"] = sales_search.build_search_index(frame, derived["bitmaps"])
+    derived["table_cache"] = sales_table.new_table_cache()
+    return derived
+
+# A snapshot built by appending rows dated on or after the previous snapshot's
+# last row keeps the previous rows first. Only the new rows are cubed and
+# indexed; their cells, prefix sums and bitmaps are merged into the previous
+# snapshot's, which stay untouched for readers still holding it
+def _derive_appended(previous, frame):
+    """Everything derive_snapshot builds from the rows, extended from the previous snapshot's by the rows appended to it"""
+    start = previous["rows"]
+    tail = frame.iloc[start:]
+    if len(tail) == 0:
+        return {key: previous[key] for key in (
+            "min_date", "max_date", "grand_total_revenue", "cube", "rollups", "date_index",
+            "bitmaps", "prefix_sums", "search_index", "table_cache"
+        )}
+    tail_cube = build_cube(tail)
+    cube, cut = append_cells(previous["cube"], tail_cube, ["Date"] + CUBE_DIMENSIONS)
+    bitmaps = sales_index.extend_bitmap_indexes(previous["bitmaps"], frame, start)
+    return {
+        "min_date": previous["min_date"],
+        "max_date": frame["Date"].iloc[-1].date(),
+        "grand_total_revenue": previous["grand_total_revenue"] + tail["Revenue"].sum(),
+        "cube": cube,
+        "rollups": extend_rollups(previous["rollups"], cube, cut, tail_cube),
+        "date_index": sales_index.build_date_index(frame["Date"]),
+        "bitmaps": bitmaps,
+        "prefix_sums": extend_prefix_sums(previous["prefix_sums"], tail_cube),
+        "search_index": sales_search.extend_search_index(previous["search_index"], frame, bitmaps, start),
+        "table_cache": sales_table.new_table_cache()
+    }
+
+def snapshot_row_ids(snapshot, filters):
+    """Row ids of the snapshot rows matching the filters, through its date and bitmap indexes"""
+    if filters == snapshot["default_filters"]:
+        return snapshot["default_rows"]
+    return filter_row_ids(filters, snapshot["date_index"], snapshot["bitmaps"])
+
+def snapshot_search_ids(snapshot, filters, query):
+    """Row ids of the snapshot rows matching the filters and the search query, through its search index"""
+    return sales_search.search_rows(snapshot["search_index"], query, filters, snapshot["date_index"], snapshot["bitmaps"])
+
+def snapshot_kpis(snapshot, filters, session=None):
+    """The KPI card values for the filters, from prefix sums when they can answer them"""
+    kpis = prefix_kpis(snapshot["prefix_sums"], filters)
+    if kpis is None:
+        aggregates = snapshot_aggregates(snapshot, filters, session)
+        kpis = {key: aggregates[key] for key in KPI_KEYS}
+    return kpis
+
+def snapshot_aggregates(snapshot, filters, session=None):
+    """Every dashboard KPI and chart frame for the filters; session (per user) lets small toggles be patched"""
+    if filters == snapshot["default_filters"]:
+        return snapshot["default_aggregates"]
+    return cached_aggregates(
+        snapshot["id"], filters,
+        lambda: finalize_aggregates(snapshot_partials(snapshot, filters, session), filters.get("granularity", DEFAULT_GRANULARITY)),
+        source=snapshot["source"]
+    )
+
+# -----------------------
+# STREAMING (OUT-OF-CORE) ENGINE
+# -----------------------
+def estimate_row_bytes(csv_path):
+    """Estimate parsed bytes per row from a small sample of the file"""
+    sample = sales_data.read_sales_csv(csv_path, nrows=SAMPLE_ROWS)
+    if sample.empty:
+        return 1
+    return max(1, int(sample.memory_usage(deep=True).sum() / len(sample)))
+
+def estimate_frame_bytes(csv_path):
+    """Estimate how much memory a full in-memory load of the CSV would take"""
+    return int(sales_data.estimate_csv_rows(csv_path) * estimate_row_bytes(csv_path))
+
+def fits_in_memory(csv_path, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Whether the whole CSV can be loaded into one frame within the budget"""
+    return estimate_frame_bytes(csv_path) <= memory_budget_mb * 1024 * 1024
+
+def chunk_rows_for_budget(csv_path, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Rows per chunk that keep one parsed chunk and its intermediates inside the budget"""
+    budget = memory_budget_mb * 1024 * 1024
+    return max(SAMPLE_ROWS, budget // (estimate_row_bytes(csv_path) * CHUNK_HEADROOM))
+
+def stream_partials(csv_path, filters=None, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Compute partial aggregates over a CSV of any size, one bounded chunk at a time"""
+    chunksize = chunk_rows_for_budget(csv_path, memory_budget_mb)
+    partials = None
+    for chunk in sales_data.iter_sales_csv(csv_path, chunksize):
+        chunk_partials = partial_aggregates(apply_filters(chunk, filters))
+        partials = chunk_partials if partials is None else merge_partials(partials, chunk_partials)
+    if partials is None:
+        partials = partial_aggregates(sales_data.read_sales_csv(csv_path, nrows=0))
+    return partials
+
+def default_stream_filters(summary):
+    """The default view's row filters over whole-file partials: every region and category, the top products, every date"""
+    return {
+        "regions": sorted(summary["region_revenue"].index),
+        "categories": sorted(summary["category_revenue"].index),
+        "products": sales_topk.top_keys(sales_topk.new_ranking(summary["product_revenue"]), TOP_PRODUCT_OPTIONS),
+        "start_date": None if summary["min_date"] is None else summary["min_date"].date(),
+        "end_date": None if summary["max_date"] is None else summary["max_date"].date()
+    }
+
+# The watcher streams a file too large to load once per change, for the
+# whole-file summary and the default view, so the first rerun after a change
+# finds both ready. state["warm"] is replaced whole and never mutated, so
+# readers take it without locking
+def new_stream_state():
+    """An empty record of streamed partials; share one per file across sessions"""
+    return {"lock": threading.Lock(), "warm": None}
+
+def prewarm_stream_partials(csv_path, state, signature, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Stream the whole-file summary and the default view's partials, once per file signature"""
+    with state["lock"]:
+        warm = state["warm"]
+        if warm is None or warm["signature"] != signature:
+            summary = stream_partials(csv_path, None, memory_budget_mb)
+            filters = default_stream_filters(summary)
+            state["warm"] = {
+                "signature": signature,
+                "partials": {
+                    canonical_filters(None): summary,
+                    canonical_filters(filters): stream_partials(csv_path, filters, memory_budget_mb)
+                }
+            }
+        return state["warm"]
+
+def prewarmed_stream_partials(state, signature, filters):
+    """Partials the watcher already streamed for these row filters at this file signature, or None"""
+    warm = state["warm"]
+    if warm is None or warm["signature"] != signature:
+        return None
+    return warm["partials"].get(canonical_filters(filters))
+
+def stream_stratified_sample(csv_path, memory_budget_mb=MEMORY_BUDGET_MB):
+    """A stratified sample of a CSV of any size, drawn in one bounded pass"""
+    chunksize = chunk_rows_for_budget(csv_path, memory_budget_mb)
+    return build_stratified_sample(sales_data.iter_sales_csv(csv_path, chunksize), sales_data.estimate_csv_rows(csv_path))
+
+# -----------------------
+# APPROXIMATE (SAMPLED) AGGREGATES
+# -----------------------
+# Every row draws a uniform key, and a stratum's sample of m rows is its m
+# smallest keys: a simple random sample within the stratum. Larger samples
+# contain the smaller ones, so estimates are refined level by level from one
+# draw. Region and Category filters select whole strata; date and product
+# filters are estimated as domains inside them
+def _stratum_codes(frame):
+    """A code per row for its Region x Category stratum, and the label of every code"""
+    codes, labels = 0, [""]
+    for name in APPROX_STRATA:
+        values, names = _group_codes(frame[name])
+        # A missing value gets the slot after the last label
+        values = np.where(values < 0, len(names), values)
+        codes = codes * (len(names) + 1) + values
+        labels = [f"{a} / {b}" if a else str(b) for a in labels for b in [*names, "nan"]]
+    return codes, labels
+
+def _sample_candidates(frame, rng, rate):
+    """Rows of one frame or chunk that may end up in the sample, and the chunk's rows per stratum"""
+    keys = rng.random(len(frame))
+    codes, labels = _stratum_codes(frame)
+    counts = np.bincount(codes, minlength=len(labels))
+    keep = keys < rate
+    # Strata with too few rows under the rate also keep their lowest keys, so
+    # that small strata are sampled whole
+    short = np.flatnonzero(np.bincount(codes, weights=keep, minlength=len(labels)) < np.minimum(counts, APPROX_MIN_STRATUM_ROWS))
+    if len(short):
+        rows = np.flatnonzero(np.isin(codes, short))
+        rows = rows[np.lexsort((keys[rows], codes[rows]))]
+        ranks = np.arange(len(rows)) - np.searchsorted(codes[rows], codes[rows])
+        keep[rows[ranks < APPROX_MIN_STRATUM_ROWS]] = True
+    present = np.flatnonzero(counts)
+    stratum = pd.Categorical.from_codes(codes[keep], categories=labels)
+    candidates = frame[keep].assign(_key=keys[keep], _stratum=stratum)
+    return candidates, pd.Series(counts[present], index=[labels[i] for i in present])
+
+def build_stratified_sample(frames, expected_rows, max_rows=APPROX_LEVELS[-1], seed=APPROX_SEED):
+    """Draw a stratified sample of about max_rows rows from a frame or chunks; None when there are no rows"""
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    rng = np.random.default_rng(seed)
+    rate = min(1.0, max_rows / max(1.0, expected_rows))
+    parts, population = [], None
+    for frame in frames:
+        candidates, counts = _sample_candidates(frame, rng, rate)
+        parts.append(candidates)
+        population = counts if population is None else population.add(counts, fill_value=0)
+    if population is None or population.sum() == 0:
+        return None
+    sample = sales_data.concat_sales_frames(parts) if len(parts) > 1 else parts[0].reset_index(drop=True)
+
+    strata, labels = pd.factorize(sample["_stratum"])
+    order = np.lexsort((sample["_key"].to_numpy(), strata))
+    sample, strata = sample.take(order).reset_index(drop=True), strata[order]
+    starts = np.searchsorted(strata, np.arange(len(labels)))
+    ranks = np.arange(len(sample)) - starts[strata]
+
+    # Chunks each kept their own lowest keys; trim every stratum back to a
+    # prefix of its globally smallest keys so it stays a simple random sample
+    population = population.reindex(labels).to_numpy(dtype=np.int64)
+    below = np.bincount(strata, weights=sample["_key"].to_numpy() < rate, minlength=len(labels))
+    depth = np.maximum(below, np.minimum(population, APPROX_MIN_STRATUM_ROWS)).astype(np.int64)
+    keep = ranks < depth[strata]
+    return {
+        "frame": sample[keep].drop(columns=["_key", "_stratum"]).reset_index(drop=True),
+        "strata": strata[keep],
+        "ranks": ranks[keep],
+        "population": population,
+        "available": np.bincount(strata[keep], minlength=len(labels)),
+        "rows": int(population.sum())
+    }
+
+def approximate_levels(sample):
+    """The sample sizes to refine through, ending with the whole sample"""
+    drawn = int(sample["available"].sum())
+    return [level for level in APPROX_LEVELS if level < drawn] + [drawn]
+
+def _level_sizes(sample, target_rows):
+    """Rows each stratum contributes at a sample size: proportional, at least the minimum, at most what was drawn"""
+    population = sample["population"]
+    proportional = np.ceil(target_rows * population / sample["rows"])
+    sizes = np.maximum(proportional, np.minimum(population, APPROX_MIN_STRATUM_ROWS))
+    return np.minimum(sizes, sample["available"]).astype(np.int64)
+
+def approximate_aggregates(sample, target_rows, filters=None):
+    """Estimated KPIs and chart frames from about target_rows sampled rows, with 95% margins"""
+    population = sample["population"]
+    sizes = _level_sizes(sample, target_rows)
+    level = sample["ranks"] < sizes[sample["strata"]]
+    rows = sample["frame"][level]
+    strata = sample["strata"][level]
+    domain = filter_mask(rows, filters).to_numpy()
+    weights = np.where(domain, (population / sizes)[strata], 0.0)
+
+    weighted = pd.DataFrame({
+        "Date": rows["Date"],
+        "Product": rows["Product"],
+        "Category": rows["Category"],
+        "Region": rows["Region"],
+        "Revenue": rows["Revenue"].to_numpy(dtype=np.float64) * weights,
+        "Quantity": rows["Quantity"].to_numpy(dtype=np.float64) * weights,
+        "Orders": weights
+    })[domain]
+    partials = partial_aggregates(weighted)
+    orders = float(partials["weekday_count"].sum())
+    partials["rows"] = int(round(orders))
+    granularity = (filters or {}).get("granularity", DEFAULT_GRANULARITY)
+    aggregates = finalize_aggregates(partials, granularity)
+    aggregates["total_quantity"] = int(round(aggregates["total_quantity"]))
+    aggregates["avg_order_value"] = partials["total_revenue"] / orders if orders else float("nan")
+
+    # Stratified variance of an estimated total: sum over strata of
+    # N^2 (1 - n/N) s^2 / n, where s^2 is the sample variance of the value
+    # (zero outside the domain). Strata sampled whole contribute nothing
+    n = sizes.astype(np.float64)
+    scale = np.where((sizes > 1) & (sizes < population), population ** 2 * (1 - n / population) / np.maximum(n * (n - 1), 1), 0.0)
+
+    def margins(values, groups=None, n_groups=1):
+        values = np.where(domain, values, 0.0)
+        keys = strata * n_groups + (0 if groups is None else groups)
+        size = len(population) * n_groups
+        s1 = np.bincount(keys, weights=values, minlength=size).reshape(-1, n_groups)
+        s2 = np.bincount(keys, weights=values ** 2, minlength=size).reshape(-1, n_groups)
+        variance = (scale[:, None] * (s2 - s1 ** 2 / np.maximum(n, 1)[:, None])).sum(axis=0)
+        return APPROX_Z * np.sqrt(np.maximum(variance, 0.0))
+
+    def group_margins(codes, labels, values):
+        valid = codes >= 0
+        codes = np.where(valid, codes, 0)
+        return pd.Series(margins(np.where(valid, values, 0.0), codes, max(1, len(labels))), index=labels)
+
+    revenue = np.nan_to_num(rows["Revenue"].to_numpy(dtype=np.float64))
+    quantity = np.nan_to_num(rows["Quantity"].to_numpy(dtype=np.float64))
+    # The average order value is a ratio; linearise it around the estimate
+    ratio = aggregates["avg_order_value"] if orders else 0.0
+    aggregates["margins"] = {
+        "total_revenue": float(margins(revenue)[0]),
+        "total_quantity": float(margins(quantity)[0]),
+        "avg_order_value": float(margins(revenue - ratio)[0]) / orders if orders else float("nan"),
+        "total_orders": float(margins(np.ones(len(rows)))[0])
+    }
+
+    products = group_margins(*_group_codes(rows["Product"]), revenue)
+    regions = group_margins(*_group_codes(rows["Region"]), revenue)
+    period_codes, periods = pd.factorize(period_starts(rows["Date"].to_numpy().astype("datetime64[D]"), granularity))
+    trend = group_margins(period_codes, pd.Index(period_labels(np.asarray(periods), granularity)), revenue)
+    aggregates["top_products"]["Revenue_CI"] = aggregates["top_products"]["Product"].map(products).to_numpy()
+    aggregates["region"]["Revenue_CI"] = aggregates["region"]["Region"].map(regions).to_numpy()
+    aggregates["trend"]["Revenue_CI"] = aggregates["trend"]["Date"].map(trend).to_numpy()
+    aggregates["sampled_rows"] = int(sizes.sum())
+    aggregates["population_rows"] = sample["rows"]
+    return aggregates
+
+def progressive_aggregates(sample, filters=None, target=APPROX_TARGET, budget_ms=APPROX_BUDGET_MS):
+    """Yield estimates over growing samples until the revenue margin is within target or the time budget is spent"""
+    deadline = time.perf_counter() + budget_ms / 1000
+    previous = None
+    for level in approximate_levels(sample):
+        started = time.perf_counter()
+        # Cost grows with the sample size, so a level that the last one's time,
+        # scaled up, says would overrun the deadline is not started
+        if previous is not None and started + previous[1] * level / previous[0] > deadline:
+            return
+        aggregates = approximate_aggregates(sample, level, filters)
+        previous = (level, time.perf_counter() - started)
+        # A level with no matching rows says nothing; try a larger one
+        if aggregates["total_orders"]:
+            yield aggregates
+            if aggregates["margins"]["total_revenue"] <= target * abs(aggregates["total_revenue"]):
+                return
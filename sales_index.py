@@ -0,0 +1,240 @@
+import numpy as np
+
+# -----------------------
+# CONFIG
+# -----------------------
+# Roaring layout: row ids are split into 2^16-row containers keyed by their
+# high bits. A container holding at most ARRAY_LIMIT rows is a sorted uint16
+# array of the low bits; a fuller one is a 65536-bit bitmap stored as 1024
+# uint64 words. Both stay under 8 KB, and empty containers are never stored
+CONTAINER_BITS = 16
+CONTAINER_ROWS = 1 << CONTAINER_BITS
+ARRAY_LIMIT = 4096
+INDEXED_DIMENSIONS = ["Region", "Category", "Product"]
+
+# -----------------------
+# CONTAINERS
+# -----------------------
+def _is_dense(container):
+    return container.dtype == np.uint64
+
+def _to_words(container):
+    """A container as 1024 uint64 words"""
+    if _is_dense(container):
+        return container
+    bits = np.zeros(CONTAINER_ROWS, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+def _to_low_bits(container):
+    """A container as its sorted uint16 low bits"""
+    if not _is_dense(container):
+        return container
+    bits = np.unpackbits(container.view(np.uint8), bitorder="little")
+    return np.flatnonzero(bits).astype(np.uint16)
+
+def _shrink(words):
+    """Store a dense result as an array again once it is sparse; None when empty"""
+    low = _to_low_bits(words)
+    if len(low) == 0:
+        return None
+    return low if len(low) <= ARRAY_LIMIT else words
+
+def _contains(words, low):
+    """Which of the sorted low bits are set in a dense container"""
+    low = low.astype(np.int64)
+    return ((words[low >> 6] >> (low & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+def _intersect_containers(a, b):
+    if not _is_dense(a) and not _is_dense(b):
+        low = np.intersect1d(a, b, assume_unique=True)
+        return low if len(low) else None
+    if _is_dense(a) and _is_dense(b):
+        return _shrink(a & b)
+    words, low = (a, b) if _is_dense(a) else (b, a)
+    low = low[_contains(words, low)]
+    return low if len(low) else None
+
+def _union_containers(containers):
+    if len(containers) == 1:
+        return containers[0]
+    if all(not _is_dense(c) for c in containers) and sum(len(c) for c in containers) <= ARRAY_LIMIT:
+        return np.unique(np.concatenate(containers))
+    words = _to_words(containers[0]).copy()
+    for container in containers[1:]:
+        words |= _to_words(container)
+    return words
+
+# -----------------------
+# BITMAPS
+# -----------------------
+# A bitmap is a dict of container key -> container, like a roaring bitmap.
+# Index bitmaps, as built and extended here, hold their keys in ascending order
+def bitmap_from_rows(rows):
+    """Build a bitmap from sorted row ids"""
+    rows = np.asarray(rows, dtype=np.int64)
+    high = rows >> CONTAINER_BITS
+    keys, starts = np.unique(high, return_index=True)
+    bitmap = {}
+    for key, low in zip(keys.tolist(), np.split((rows & (CONTAINER_ROWS - 1)).astype(np.uint16), starts[1:])):
+        bitmap[key] = low if len(low) <= ARRAY_LIMIT else _to_words(low)
+    return bitmap
+
+def bitmap_to_rows(bitmap):
+    """The sorted row ids in a bitmap"""
+    parts = [
+        (np.int64(key) << CONTAINER_BITS) + _to_low_bits(bitmap[key]).astype(np.int64)
+        for key in sorted(bitmap)
+    ]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+def bitmap_union(bitmaps):
+    """Rows present in any of the bitmaps"""
+    grouped = {}
+    for bitmap in bitmaps:
+        for key, container in bitmap.items():
+            grouped.setdefault(key, []).append(container)
+    return {key: _union_containers(containers) for key, containers in grouped.items()}
+
+def bitmap_intersection(bitmaps):
+    """Rows present in every bitmap"""
+    bitmaps = sorted(bitmaps, key=len)
+    result = bitmaps[0]
+    for bitmap in bitmaps[1:]:
+        merged = {}
+        for key, container in result.items():
+            other = bitmap.get(key)
+            if other is not None:
+                both = _intersect_containers(container, other)
+                if both is not None:
+                    merged[key] = both
+        result = merged
+        if not result:
+            break
+    return result
+
+def truncate_bitmap(bitmap, stop):
+    """The rows of an index bitmap before stop"""
+    last = stop >> CONTAINER_BITS
+    if not bitmap or next(reversed(bitmap)) < last:
+        return bitmap
+    kept = dict(bitmap)
+    boundary = None
+    while kept and next(reversed(kept)) >= last:
+        key, container = kept.popitem()
+        if key == last:
+            boundary = container
+    if boundary is not None:
+        low = _to_low_bits(boundary)
+        low = low[low < (stop & (CONTAINER_ROWS - 1))]
+        if len(low):
+            kept[last] = low if len(low) <= ARRAY_LIMIT else _to_words(low)
+    return kept
+
+# -----------------------
+# DIMENSION INDEXES
+# -----------------------
+def build_bitmap_indexes(frame, dimensions=INDEXED_DIMENSIONS, first_row=0):
+    """One bitmap per value of each categorical dimension, built from the dictionary codes; row ids start at first_row"""
+    indexes = {}
+    for name in dimensions:
+        column = frame[name].astype("category")
+        codes = column.cat.codes.to_numpy()
+        # A stable sort groups row ids by code while keeping each group sorted.
+        # Cutting it wherever the code or the container key changes yields every
+        # container of every bitmap in one vectorized pass, however many labels
+        order = np.argsort(codes, kind="stable")[int((codes < 0).sum()):]
+        by_code = codes[order]
+        rows = order.astype(np.int64) + first_row
+        high = rows >> CONTAINER_BITS
+        starts = np.flatnonzero(np.concatenate(([len(rows) > 0], (by_code[1:] != by_code[:-1]) | (high[1:] != high[:-1]))))
+        stops = np.append(starts[1:], len(rows))
+        low = (rows & (CONTAINER_ROWS - 1)).astype(np.uint16)
+        labels = [str(label) for label in column.cat.categories]
+        index = {}
+        for code, key, start, stop in zip(by_code[starts].tolist(), high[starts].tolist(), starts.tolist(), stops.tolist()):
+            container = low[start:stop]
+            index.setdefault(labels[code], {})[key] = container if stop - start <= ARRAY_LIMIT else _to_words(container)
+        indexes[name] = index
+    return indexes
+
+def extend_bitmap_indexes(indexes, frame, start, dimensions=INDEXED_DIMENSIONS):
+    """The indexes of a frame whose rows before start are the ones indexed; rows from start on are indexed and merged in"""
+    added = build_bitmap_indexes(frame.iloc[start:], dimensions, first_row=start)
+    extended = {}
+    for name in dimensions:
+        index = {}
+        for label, bitmap in indexes[name].items():
+            bitmap = truncate_bitmap(bitmap, start)
+            if bitmap:
+                index[label] = bitmap
+        for label, bitmap in added[name].items():
+            if label not in index:
+                index[label] = bitmap
+                continue
+            # New rows only share the container holding start
+            merged = dict(index[label])
+            for key, container in bitmap.items():
+                merged[key] = _union_containers([merged[key], container]) if key in merged else container
+            index[label] = merged
+        extended[name] = index
+    return extended
+
+def bitmap_range(bitmap, start, stop):
+    """The containers of a bitmap that overlap rows [start, stop)"""
+    first, last = start >> CONTAINER_BITS, (stop - 1) >> CONTAINER_BITS
+    return {key: container for key, container in bitmap.items() if first <= key <= last}
+
+def trim_rows(rows, start, stop):
+    """The sorted row ids that fall in [start, stop)"""
+    return rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+
+def select_dimension_bitmap(indexes, filters, start=0, stop=None):
+    """A bitmap covering the rows matching the dimension filters (union within, intersection across), or None for all rows"""
+    selected = []
+    for name, key in (("Region", "regions"), ("Category", "categories"), ("Product", "products")):
+        values = filters.get(key) if filters else None
+        if values is None:
+            continue
+        index = indexes[name]
+        bitmaps = [index[str(v)] for v in values if str(v) in index]
+        if stop is not None:
+            bitmaps = [bitmap_range(b, start, stop) for b in bitmaps]
+        selected.append(bitmap_union(bitmaps))
+    return bitmap_intersection(selected) if selected else None
+
+def select_dimension_rows(indexes, filters, start=0, stop=None):
+    """Row ids in [start, stop) matching the dimension filters, or None for all rows"""
+    bitmap = select_dimension_bitmap(indexes, filters, start, stop)
+    if bitmap is None:
+        return None
+    rows = bitmap_to_rows(bitmap)
+    return rows if stop is None else trim_rows(rows, start, stop)
+
+# -----------------------
+# DATE INDEX
+# -----------------------
+# Snapshots are sorted by Date, so the rows of one day are contiguous. offsets[i]
+# is the first row on or after day origin + i, which turns any date range into
+# a slice found with two array lookups
+def build_date_index(dates):
+    """Day offsets over a date-sorted column"""
+    days = dates.to_numpy().astype("datetime64[D]")
+    if len(days) == 0:
+        return {"origin": None, "offsets": np.zeros(1, dtype=np.int64)}
+    span = np.arange(days[0], days[-1] + np.timedelta64(2, "D"))
+    return {"origin": days[0], "offsets": np.searchsorted(days, span)}
+
+def date_slice(index, start_date=None, end_date=None):
+    """The [start, stop) rows dated start_date through end_date, both inclusive"""
+    offsets = index["offsets"]
+    if index["origin"] is None:
+        return 0, 0
+
+    def first_row(day):
+        i = int((np.datetime64(day, "D") - index["origin"]).astype(np.int64))
+        return int(offsets[min(max(i, 0), len(offsets) - 1)])
+
+    start = 0 if start_date is None else first_row(start_date)
+    stop = int(offsets[-1]) if end_date is None else first_row(np.datetime64(end_date, "D") + 1)
+    return start, max(start, stop)
@@ -0,0 +1,373 @@
+import operator
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache, reduce
+
+import numpy as np
+import pandas as pd
+
+import sales_index
+import sales_table
+
+# -----------------------
+# CONFIG
+# -----------------------
+# Needles shorter than a trigram are checked against every distinct value
+GRAM = 3
+# Distinct queries whose parse and compiled lookups are kept
+QUERY_CACHE_SIZE = 256
+
+# A term is free text, or field:text (contains), field=value (equals) or a
+# comparison on a number or date column. Quotes keep spaces inside one term
+TERM_PATTERN = re.compile(r'(?:(\w+)(>=|<=|:|=|>|<))?(?:"([^"]*)"|(\S+))')
+COMPARISONS = {"=": operator.eq, ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+# -----------------------
+# TRIGRAMS
+# -----------------------
+def _gram_keys(texts):
+    """(trigram key, text number) for every trigram of every text"""
+    chars = np.array(texts, dtype=str)
+    width = chars.dtype.itemsize // 4
+    points = chars.view(np.uint32).reshape(len(texts), width).astype(np.int64)
+    lengths = np.char.str_len(chars)
+    keys, owners = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for i in range(width - GRAM + 1):
+        valid = np.flatnonzero(lengths >= i + GRAM)
+        # Code points fit in 21 bits, so three of them pack into one int64
+        keys.append((points[valid, i] << 42) | (points[valid, i + 1] << 21) | points[valid, i + 2])
+        owners.append(valid)
+    return np.concatenate(keys), np.concatenate(owners)
+
+def build_trigrams(texts):
+    """Sorted trigram keys with, for each, the sorted numbers of the texts holding it"""
+    keys, owners = _gram_keys(texts)
+    order = np.lexsort((owners, keys))
+    keys, owners = keys[order], owners[order]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = (keys[1:] != keys[:-1]) | (owners[1:] != owners[:-1])
+    keys, owners = keys[keep], owners[keep]
+    grams, starts = np.unique(keys, return_index=True)
+    return {"grams": grams, "starts": np.append(starts, len(keys)), "owners": owners}
+
+def matching_values(index, needle, column=None):
+    """Numbers of the distinct value texts, of one column or all, containing the lower-cased needle"""
+    texts = index["texts"]
+    lo, hi = (0, len(texts)) if column is None else index["columns"][column]["values"]
+    if len(needle) < GRAM:
+        pool = range(lo, hi)
+    else:
+        trigrams = index["trigrams"]
+        grams = trigrams["grams"]
+        wanted = np.unique(_gram_keys([needle])[0])
+        at = np.searchsorted(grams, wanted)
+        if np.any(at == len(grams)) or np.any(grams[np.minimum(at, len(grams) - 1)] != wanted):
+            return []
+        postings = sorted(
+            (trigrams["owners"][trigrams["starts"][a]:trigrams["starts"][a + 1]] for a in at.tolist()),
+            key=len
+        )
+        pool = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), postings)
+        pool = pool[(pool >= lo) & (pool < hi)].tolist()
+    # Trigrams only narrow the candidates; the substring check decides
+    return [v for v in pool if needle in texts[v]]
+
+# -----------------------
+# SUBSTRING INDEX
+# -----------------------
+# The index holds each searchable column's distinct values once, rendered the
+# way astype(str) renders them, so matching a needle against a few thousand
+# strings stands in for matching it against every cell. A matched value's rows
+# come from the structure that is cheapest for its column:
+#   "bitmaps"   the filter bitmaps of the dimension columns
+#   "slices"    Date, whose values are contiguous in the date-sorted frame
+#   "postings"  row ids grouped by dictionary code (a stable radix argsort)
+def _bitmap_column(frame, name, bitmaps):
+    labels = list(bitmaps)
+    column = {"kind": "bitmaps", "keys": labels, "bitmaps": dict(bitmaps)}
+    missing = np.flatnonzero(frame[name].isna().to_numpy())
+    if len(missing):
+        column["keys"].append("nan")
+        column["bitmaps"]["nan"] = sales_index.bitmap_from_rows(missing)
+    return column, column["keys"]
+
+def _slice_column(frame, name):
+    values = frame[name].to_numpy()
+    firsts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+    uniques = values[firsts]
+    bounds = np.append(firsts, len(values))
+    column = {"kind": "slices", "keys": list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))}
+    return column, pd.Series(uniques, dtype=frame[name].dtype).astype(str).tolist()
+
+def _postings_column(frame, name):
+    codes, uniques = pd.factorize(frame[name], use_na_sentinel=False)
+    row_dtype = np.int32 if len(frame) <= np.iinfo(np.int32).max else np.int64
+    column = {
+        "kind": "postings",
+        "keys": list(range(len(uniques))),
+        "uniques": pd.Index(uniques),
+        "order": sales_table.stable_argsort(codes).astype(row_dtype),
+        "bounds": np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+    }
+    if pd.api.types.is_numeric_dtype(frame[name]):
+        # Comparisons run on the column itself
+        column["array"] = frame[name].to_numpy()
+    return column, pd.Series(uniques, dtype=frame[name].dtype).astype(str).tolist()
+
+def _extend_postings_column(old, frame, name, start):
+    """A postings column over a frame whose rows before start are the ones indexed"""
+    codes, uniques = pd.factorize(frame[name].iloc[start:], use_na_sentinel=False)
+    found = old["uniques"].get_indexer(pd.Index(uniques))
+    new = np.flatnonzero(found < 0)
+    found[new] = len(old["uniques"]) + np.arange(len(new))
+    codes = found[codes]
+    n_codes = len(old["uniques"]) + len(new)
+
+    # Each value's indexed rows keep their order at the front of its group, and
+    # its new rows follow them in row order
+    old_bounds = np.pad(old["bounds"], (0, len(new)), mode="edge")
+    old_counts = np.diff(old_bounds)
+    new_counts = np.bincount(codes, minlength=n_codes)
+    bounds = np.concatenate([[0], np.cumsum(old_counts + new_counts)])
+    row_dtype = np.int32 if len(frame) <= np.iinfo(np.int32).max else np.int64
+    order = np.empty(int(bounds[-1]), dtype=row_dtype)
+    order[np.arange(int(old_bounds[-1])) + np.repeat(bounds[:-1] - old_bounds[:-1], old_counts)] = old["order"]
+    by_code = sales_table.stable_argsort(codes)
+    sorted_codes = codes[by_code]
+    ranks = np.arange(len(codes)) - np.concatenate([[0], np.cumsum(new_counts)])[sorted_codes]
+    order[bounds[sorted_codes] + old_counts[sorted_codes] + ranks] = by_code + start
+
+    column = {
+        "kind": "postings",
+        "keys": list(range(n_codes)),
+        "uniques": old["uniques"].append(pd.Index(uniques[new])),
+        "order": order,
+        "bounds": bounds
+    }
+    if "array" in old:
+        column["array"] = frame[name].to_numpy()
+    return column, pd.Series(uniques[new], dtype=frame[name].dtype).astype(str).tolist()
+
+def column_kinds(frame, columns=None):
+    """(name, "date" | "number" | "text") for the columns a query can name"""
+    columns = list(frame.columns) if columns is None else columns
+    return tuple(
+        (name, "date" if name == "Date" else "number" if pd.api.types.is_numeric_dtype(frame[name]) else "text")
+        for name in columns
+    )
+
+def build_search_index(frame, bitmaps, columns=None):
+    """Trigram index over the distinct values of a date-sorted frame's columns"""
+    columns = list(frame.columns) if columns is None else columns
+    specs, texts, owners = {}, [], []
+    for name in columns:
+        if name == "Date":
+            column, rendered = _slice_column(frame, name)
+        elif name in bitmaps:
+            column, rendered = _bitmap_column(frame, name, bitmaps[name])
+        else:
+            column, rendered = _postings_column(frame, name)
+        column["values"] = (len(texts), len(texts) + len(rendered))
+        specs[name] = column
+        texts.extend(text.lower() for text in rendered)
+        owners.extend((name, key) for key in column["keys"])
+    return {
+        "columns": specs,
+        "kinds": column_kinds(frame, columns),
+        "texts": texts,
+        "owners": owners,
+        "trigrams": build_trigrams(texts),
+        "plans": OrderedDict(),
+        "lock": threading.Lock()
+    }
+
+def extend_search_index(index, frame, bitmaps, start):
+    """The search index of a frame whose rows before start are the ones indexed; the values and postings of rows from start on are merged in"""
+    specs, texts, owners = {}, [], []
+    for name, old in index["columns"].items():
+        if old["kind"] == "postings":
+            column, added = _extend_postings_column(old, frame, name, start)
+            lo, hi = old["values"]
+            lowered = index["texts"][lo:hi] + [text.lower() for text in added]
+        else:
+            # Dates and dimension labels are few, so these columns are rebuilt
+            if old["kind"] == "slices":
+                column, rendered = _slice_column(frame, name)
+            else:
+                column, rendered = _bitmap_column(frame, name, bitmaps[name])
+            lowered = [text.lower() for text in rendered]
+        column["values"] = (len(texts), len(texts) + len(lowered))
+        specs[name] = column
+        texts.extend(lowered)
+        owners.extend((name, key) for key in column["keys"])
+    return {
+        "columns": specs,
+        "kinds": column_kinds(frame, list(specs)),
+        "texts": texts,
+        "owners": owners,
+        "trigrams": build_trigrams(texts),
+        "plans": OrderedDict(),
+        "lock": threading.Lock()
+    }
+
+def _column_bitmap(column, keys, start, stop):
+    """Rows in [start, stop) holding any of the column's matched values"""
+    if column["kind"] == "bitmaps":
+        return sales_index.bitmap_union(
+            sales_index.bitmap_range(column["bitmaps"][key], start, stop) for key in keys
+        )
+    if column["kind"] == "slices":
+        spans = [(max(first, start), min(last, stop)) for first, last in keys]
+        parts = [np.arange(first, last, dtype=np.int64) for first, last in spans if first < last]
+    else:
+        order, bounds = column["order"], column["bounds"]
+        parts = [order[bounds[key]:bounds[key + 1]] for key in keys]
+    rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+    return sales_index.bitmap_from_rows(sales_index.trim_rows(rows, start, stop))
+
+def _values_bitmap(index, values, start, stop):
+    """Rows in [start, stop) holding any of the given distinct values"""
+    matched = {}
+    for value in values:
+        name, key = index["owners"][value]
+        matched.setdefault(name, []).append(key)
+    return sales_index.bitmap_union(
+        _column_bitmap(index["columns"][name], keys, start, stop) for name, keys in matched.items()
+    )
+
+def substring_bitmap(index, needle, start, stop):
+    """Rows in [start, stop) where any searchable column contains the needle, ignoring case"""
+    return _values_bitmap(index, matching_values(index, needle.lower()), start, stop)
+
+# -----------------------
+# QUERY LANGUAGE
+# -----------------------
+# region:North product:"Smartphone Pro" revenue>50000 date:2024-09
+# Terms are ANDed. A query is parsed into sorted (column, operator, value)
+# clauses, so queries that differ only in term order, case or spacing share
+# one cache entry; each index keeps its compiled plans under the same key.
+# A date operand is a day, a month (2024-09) or a year (2024), compared as the
+# whole period: date=2024-09 is all of September and date>2024-09 starts in October
+def _typed_value(kind, value, term):
+    """A comparison operand read as the column's kind, dates as their (first, last) day; raises ValueError when it is not one"""
+    if kind == "date":
+        try:
+            day = pd.Timestamp(value)
+        except ValueError:
+            day = pd.NaT
+        if pd.isna(day):
+            raise ValueError(f"{term}: {value!r} is not a date")
+        if re.fullmatch(r"\d{4}", value):
+            return day.date(), date(day.year, 12, 31)
+        if re.fullmatch(r"\d{4}-\d{1,2}", value):
+            return day.date(), (day + pd.offsets.MonthEnd(0)).date()
+        return day.date(), day.date()
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{term}: {value!r} is not a number") from None
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def parse_query(text, kinds):
+    """The normalized clauses of a search query over columns of the given kinds"""
+    fields = {}
+    for name, kind in kinds:
+        fields[name.lower()] = fields[name.lower().replace("_", "")] = (name, kind)
+    clauses = set()
+    for match in TERM_PATTERN.finditer(text):
+        field, op, quoted, bare = match.groups()
+        value = quoted if quoted is not None else bare
+        if field is None or field.lower() not in fields:
+            # Not a field: the whole term, e.g. 10:30, is free text
+            clauses.add((None, ":", (match.group(0) if field else value).lower()))
+            continue
+        name, kind = fields[field.lower()]
+        if op == ":" or (op == "=" and kind == "text"):
+            clauses.add((name, op, value.lower()))
+        elif kind == "text":
+            raise ValueError(f"{match.group(0)}: {name} can only be matched with : or =")
+        else:
+            clauses.add((name, op, _typed_value(kind, value, match.group(0))))
+    return tuple(sorted(clauses, key=repr))
+
+def _compile(index, clauses):
+    """Resolve the text clauses to distinct values and the date clauses to a date range"""
+    plan = {"start_date": None, "end_date": None, "values": [], "comparisons": []}
+    kinds = dict(index["kinds"])
+    for column, op, value in clauses:
+        if op == ":":
+            plan["values"].append(matching_values(index, value, column))
+        elif kinds[column] == "text":
+            lo, hi = index["columns"][column]["values"]
+            plan["values"].append([v for v in range(lo, hi) if index["texts"][v] == value])
+        elif kinds[column] == "number":
+            plan["comparisons"].append((column, op, value))
+        else:
+            period_first, period_last = value
+            first = period_last + timedelta(days=1) if op == ">" else period_first if op in ("=", ">=") else None
+            last = period_first - timedelta(days=1) if op == "<" else period_last if op in ("=", "<=") else None
+            if first is not None:
+                plan["start_date"] = max(filter(None, (plan["start_date"], first)))
+            if last is not None:
+                plan["end_date"] = min(filter(None, (plan["end_date"], last)))
+    return plan
+
+def compile_query(index, text):
+    """The index's compiled plan for a query, from its cache when the normalized query was seen before"""
+    clauses = parse_query(text, index["kinds"])
+    with index["lock"]:
+        plan = index["plans"].get(clauses)
+        if plan is not None:
+            index["plans"].move_to_end(clauses)
+            return plan
+    plan = _compile(index, clauses)
+    with index["lock"]:
+        index["plans"][clauses] = plan
+        while len(index["plans"]) > QUERY_CACHE_SIZE:
+            index["plans"].popitem(last=False)
+    return plan
+
+def search_rows(index, text, filters, date_index, bitmaps):
+    """Sorted row ids matching the filters and every term of the query"""
+    plan = compile_query(index, text)
+    first = [d for d in (filters.get("start_date"), plan["start_date"]) if d is not None]
+    last = [d for d in (filters.get("end_date"), plan["end_date"]) if d is not None]
+    start, stop = sales_index.date_slice(date_index, max(first, default=None), min(last, default=None))
+    selected = [_values_bitmap(index, values, start, stop) for values in plan["values"]]
+    for column, op, value in plan["comparisons"]:
+        hits = COMPARISONS[op](index["columns"][column]["array"][start:stop], value)
+        selected.append(sales_index.bitmap_from_rows(np.flatnonzero(hits) + start))
+    selection = sales_index.select_dimension_bitmap(bitmaps, filters, start, stop)
+    if selection is not None:
+        selected.append(selection)
+    if not selected:
+        return np.arange(start, stop, dtype=np.int64)
+    rows = sales_index.bitmap_to_rows(sales_index.bitmap_intersection(selected))
+    return sales_index.trim_rows(rows, start, stop)
+
+def query_mask(frame, text):
+    """Rows of an unindexed frame matching every term of the query, for backends without a search index"""
+    kinds = column_kinds(frame)
+    mask = np.ones(len(frame), dtype=bool)
+    for column, op, value in parse_query(text, kinds):
+        if column is None:
+            hits = frame.astype(str).apply(
+                lambda x: x.str.contains(value, case=False, regex=False)
+            ).any(axis=1).to_numpy()
+        elif op == ":":
+            hits = frame[column].astype(str).str.contains(value, case=False, regex=False).to_numpy()
+        elif dict(kinds)[column] == "text":
+            hits = (frame[column].astype(str).str.lower() == value).to_numpy()
+        elif dict(kinds)[column] == "date":
+            days = frame[column].dt.normalize().to_numpy()
+            first, last = (np.datetime64(day, "ns") for day in value)
+            if op == "=":
+                hits = (days >= first) & (days <= last)
+            else:
+                hits = COMPARISONS[op](days, last if op in (">", "<=") else first)
+        else:
+            hits = COMPARISONS[op](frame[column].to_numpy(), value)
+        mask &= hits
+    return mask
@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+from datetime import date
+
+import pandas as pd
+
+import sales_data
+
+# -----------------------
+# CONFIG
+# -----------------------
+DB_SUFFIX = ".sqlite"
+SCHEMA_VERSION = 1
+INSERT_CHUNK_ROWS = 200_000
+EPOCH = date(1970, 1, 1)
+
+# Table column -> sales column; a column the CSV lacks is left NULL
+TABLE_COLUMNS = {
+    "product": "Product",
+    "category": "Category",
+    "quantity": "Quantity",
+    "unit_price": "Unit_Price",
+    "revenue": "Revenue",
+    "region": "Region",
+    "sales_rep": "Sales_Rep"
+}
+
+_build_lock = threading.Lock()
+
+# -----------------------
+# DATABASE BUILD
+# -----------------------
+def db_path_for(csv_path):
+    """Return the SQLite database path that sits next to a CSV file"""
+    return csv_path + DB_SUFFIX
+
+def _db_signature(db_path):
+    """The (version, size, mtime_ns) the database was built from, or None"""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+            row = conn.execute("SELECT version, size, mtime_ns FROM build_info").fetchone()
+    except sqlite3.Error:
+        return None
+    return tuple(row) if row else None
+
+def build_sales_db(csv_path, db_path):
+    """Load the CSV into an indexed SQLite table, chunk by chunk"""
+    signature = sales_data.file_signature(csv_path)
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE sales (
+                day INTEGER NOT NULL,
+                product TEXT,
+                category TEXT,
+                quantity INTEGER,
+                unit_price REAL,
+                revenue REAL,
+                region TEXT,
+                sales_rep TEXT
+            );
+            CREATE TABLE build_info (version INTEGER, size INTEGER, mtime_ns INTEGER);
+        """)
+        for chunk in sales_data.iter_sales_csv(csv_path, INSERT_CHUNK_ROWS):
+            present = [column for column, name in TABLE_COLUMNS.items() if name in chunk.columns]
+            days = chunk["Date"].to_numpy().astype("datetime64[D]").astype("int64")
+            rows = zip(days.tolist(), *(
+                chunk[TABLE_COLUMNS[column]].astype(object).tolist()
+                if isinstance(chunk[TABLE_COLUMNS[column]].dtype, pd.CategoricalDtype)
+                else chunk[TABLE_COLUMNS[column]].tolist()
+                for column in present
+            ))
+            conn.executemany(
+                f"INSERT INTO sales (day, {', '.join(present)}) VALUES ({', '.join('?' * (len(present) + 1))})", rows
+            )
+        conn.executescript("""
+            CREATE INDEX idx_sales_day ON sales (day);
+            CREATE INDEX idx_sales_region ON sales (region);
+            CREATE INDEX idx_sales_category ON sales (category);
+            CREATE INDEX idx_sales_product ON sales (product);
+            ANALYZE;
+        """)
+        conn.execute("INSERT INTO build_info VALUES (?, ?, ?)", (SCHEMA_VERSION, *signature))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+def ensure_sales_db(csv_path=sales_data.SALES_FILE):
+    """Return an up-to-date database for the CSV, rebuilding it when the CSV changed"""
+    db_path = db_path_for(csv_path)
+    expected = (SCHEMA_VERSION, *sales_data.file_signature(csv_path))
+    if _db_signature(db_path) != expected:
+        with _build_lock:
+            if _db_signature(db_path) != expected:
+                build_sales_db(csv_path, db_path)
+    return db_path
+
+def connect(db_path):
+    """Open a read-only connection; cheap enough to do once per rerun"""
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+# -----------------------
+# PUSHED-DOWN QUERIES
+# -----------------------
+def _day_number(d):
+    return (d - EPOCH).days
+
+def where_clause(filters):
+    """Translate the sidebar filters into a WHERE clause and its parameters"""
+    clauses, params = [], []
+    if filters:
+        for key, column in (("regions", "region"), ("categories", "category"), ("products", "product")):
+            values = filters.get(key)
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+        if filters.get("start_date") is not None:
+            clauses.append("day >= ?")
+            params.append(_day_number(filters["start_date"]))
+        if filters.get("end_date") is not None:
+            clauses.append("day <= ?")
+            params.append(_day_number(filters["end_date"]))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def _grouped(conn, selects, group, where, params):
+    """One GROUP BY query returning a Series per selected aggregate"""
+    rows = conn.execute(f"SELECT {group}, {', '.join(selects)} FROM sales{where} GROUP BY 1", params).fetchall()
+    index = [r[0] for r in rows]
+    return [
+        pd.Series([r[i + 1] for r in rows], index=index, dtype="int64" if select.startswith("COUNT") else "float64")
+        for i, select in enumerate(selects)
+    ]
+
+def query_partials(conn, filters=None):
+    """The same partial aggregates as sales_engine.partial_aggregates, computed in SQL"""
+    where, params = where_clause(filters)
+    rows, revenue, quantity, min_day, max_day = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(revenue), 0), COALESCE(SUM(quantity), 0), MIN(day), MAX(day) FROM sales{where}",
+        params
+    ).fetchone()
+    # SQLite numbers weekdays from Sunday = 0; pandas from Monday = 0
+    weekday = "(CAST(strftime('%w', day * 86400, 'unixepoch') AS INTEGER) + 6) % 7"
+    to_timestamp = lambda d: None if d is None else pd.Timestamp(EPOCH) + pd.Timedelta(days=d)
+    product_revenue, product_orders = _grouped(conn, ["SUM(revenue)", "COUNT(*)"], "product", where, params)
+    day_revenue, day_orders = _grouped(conn, ["SUM(revenue)", "COUNT(*)"], "day", where, params)
+    for sums in (day_revenue, day_orders):
+        sums.index = pd.to_datetime(sums.index, unit="D")
+    category_revenue, category_orders = _grouped(conn, ["SUM(revenue)", "COUNT(*)"], "category", where, params)
+    region_revenue, region_quantity, region_orders = _grouped(
+        conn, ["SUM(revenue)", "SUM(quantity)", "COUNT(*)"], "region", where, params
+    )
+    weekday_revenue, weekday_count = _grouped(conn, ["SUM(revenue)", "COUNT(revenue)"], weekday, where, params)
+    return {
+        "rows": rows,
+        "total_revenue": revenue,
+        "total_quantity": quantity,
+        "min_date": to_timestamp(min_day),
+        "max_date": to_timestamp(max_day),
+        "product_revenue": product_revenue,
+        "day_revenue": day_revenue,
+        "category_revenue": category_revenue,
+        "region_revenue": region_revenue,
+        "region_quantity": region_quantity,
+        "weekday_revenue": weekday_revenue,
+        "weekday_count": weekday_count,
+        "product_orders": product_orders,
+        "day_orders": day_orders,
+        "category_orders": category_orders,
+        "region_orders": region_orders
+    }
+
+def query_rows(conn, filters=None):
+    """Fetch the filtered rows in the dashboard's column layout"""
+    where, params = where_clause(filters)
+    df = pd.read_sql_query(
+        "SELECT day, product AS Product, category AS Category, quantity AS Quantity, "
+        "unit_price AS Unit_Price, revenue AS Revenue, region AS Region, sales_rep AS Sales_Rep "
+        f"FROM sales{where} ORDER BY rowid",
+        conn, params=params
+    )
+    df.insert(0, "Date", pd.to_datetime(df.pop("day"), unit="D"))
+    return df
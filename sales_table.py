@@ -0,0 +1,184 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# -----------------------
+# CONFIG
+# -----------------------
+PAGE_SIZES = [25, 50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+# Formatted pages kept per dataset
+PAGE_CACHE_SIZE = int(os.getenv("SALES_PAGE_CACHE_SIZE", "64"))
+
+# How each column is shown; columns not listed are shown as they are
+COLUMN_FORMATS = {"Date": "date", "Quantity": "number", "Unit_Price": "rupees", "Revenue": "rupees"}
+
+# -----------------------
+# SORT ORDERS
+# -----------------------
+# A sort order is a permutation of every row of a frame by one column, ties in
+# row order. It is built the first time anyone sorts by that column and
+# direction, then serves every filter and search: a result comes out sorted by
+# walking the permutation and keeping the rows that belong to it. An order of
+# None means the frame is already in that order
+def new_table_cache():
+    """An empty, thread-safe cache of a frame's sort orders and formatted pages"""
+    return {"lock": threading.Lock(), "orders": {}, "pages": OrderedDict()}
+
+def sort_keys(series, descending=False):
+    """Numbers that order like the column in either direction, missing values last"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        labels = series.cat.categories.astype(str).to_numpy()
+        ranks = np.empty(len(labels) + 1, dtype=np.int64)
+        ranks[np.argsort(labels, kind="stable")] = np.arange(len(labels))
+        # Code -1 (a missing label) reads the last entry, which sorts after every
+        # label once the ranks are negated for a descending order
+        ranks[-1] = -1 if descending else len(labels)
+        keys = ranks[series.cat.codes.to_numpy()]
+        return -keys if descending else keys
+    values = series.to_numpy()
+    if values.dtype.kind == "f":
+        keys = values.astype(np.float64)
+        # NaN sorts last in a stable argsort, negated or not
+        return -keys if descending else keys
+    if values.dtype.kind == "M":
+        missing = np.isnat(values)
+        keys = values.view(np.int64)
+    elif values.dtype.kind in "iub":
+        missing = np.zeros(len(values), dtype=bool)
+        keys = values.astype(np.int64)
+    else:
+        missing = series.isna().to_numpy()
+        keys = pd.factorize(series.astype(str), sort=True)[0].astype(np.int64)
+    keys = np.where(missing, 0, -keys if descending else keys)
+    if missing.any():
+        keys[missing] = keys.max() + 1
+    return keys
+
+def stable_argsort(keys):
+    """argsort(kind="stable"), done as a radix sort when the keys are integers of a modest span"""
+    if keys.dtype.kind not in "iu" or len(keys) == 0:
+        return np.argsort(keys, kind="stable")
+    offsets = keys.astype(np.int64) - int(keys.min())
+    span = int(offsets.max())
+    if span >= 1 << 48:
+        return np.argsort(keys, kind="stable")
+    # A stable sort on 16-bit keys is a radix sort, so sort one 16-bit digit at
+    # a time, least significant first
+    order = np.argsort((offsets & 0xFFFF).astype(np.uint16), kind="stable")
+    shift = 16
+    while span >> shift:
+        order = order[np.argsort(((offsets[order] >> shift) & 0xFFFF).astype(np.uint16), kind="stable")]
+        shift += 16
+    return order
+
+def sort_order(frame, column, descending=False, cache=None):
+    """The frame's row ids ordered by a column, or None when they already are"""
+    key = (column, descending)
+    if cache is not None:
+        with cache["lock"]:
+            if key in cache["orders"]:
+                return cache["orders"][key]
+    # Descending keys are negated, which keeps ties in row order where
+    # reversing would not
+    keys = sort_keys(frame[column], descending)
+    # Checked on the keys: categorical codes follow first appearance, not label order
+    if bool(np.all(keys[1:] >= keys[:-1])):
+        order = None
+    else:
+        order = stable_argsort(keys)
+        order = order.astype(np.int32 if len(frame) <= np.iinfo(np.int32).max else np.int64)
+    if cache is not None:
+        with cache["lock"]:
+            cache["orders"][key] = order
+    return order
+
+# -----------------------
+# PAGES
+# -----------------------
+def ordered_rows(order, rows, n_rows):
+    """A result's sorted row ids, in the order of a sort order over all n_rows rows"""
+    if order is None:
+        return rows
+    member = np.zeros(n_rows, dtype=bool)
+    member[rows] = True
+    return order[member[order]]
+
+def page_count(n_results, page_size):
+    """Pages needed for a result, at least one"""
+    return max(1, -(-n_results // page_size))
+
+def page_rows(order, rows, n_rows, page, page_size):
+    """The row ids shown on one page (numbered from 1) of a sorted result"""
+    first = (page - 1) * page_size
+    return ordered_rows(order, rows, n_rows)[first:first + page_size]
+
+# -----------------------
+# FORMATTING
+# -----------------------
+# Formatting works a column at a time on the rows of one page, never the whole
+# result, and builds new display columns rather than copying and rewriting
+def _grouped(values, decimals, prefix=""):
+    """Numbers as text with Indian digit grouping (12,34,567), a sign and a prefix"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return np.array([], dtype=str)
+    missing = np.isnan(values)
+    scale = 10 ** decimals
+    units = np.round(np.abs(np.where(missing, 0, values)) * scale).astype(np.int64)
+    whole = units // scale
+    # The last three digits, then pairs; a group is zero-padded when one sits above it
+    text = np.strings.zfill((whole % 1000).astype(str), np.where(whole >= 1000, 3, 1))
+    rest = whole // 1000
+    while np.any(rest):
+        group = np.strings.zfill((rest % 100).astype(str), np.where(rest >= 100, 2, 1))
+        text = np.where(rest > 0, np.strings.add(np.strings.add(group, ","), text), text)
+        rest //= 100
+    if decimals:
+        text = np.strings.add(np.strings.add(text, "."), np.strings.zfill((units % scale).astype(str), decimals))
+    sign = np.where(~missing & (values < 0) & (units > 0), "-", "")
+    return np.where(missing, "", np.strings.add(np.strings.add(sign, prefix), text))
+
+def format_number(values):
+    """Whole numbers with Indian digit grouping: 12,34,567"""
+    return _grouped(values, 0)
+
+def format_rupees(values):
+    """Rupee amounts with Indian digit grouping and paise: ₹12,34,567.50"""
+    return _grouped(values, 2, "₹")
+
+def format_dates(values):
+    """Dates as YYYY-MM-DD"""
+    return np.datetime_as_string(np.asarray(values, dtype="datetime64[ns]").astype("datetime64[D]"), unit="D")
+
+FORMATTERS = {"date": format_dates, "number": format_number, "rupees": format_rupees}
+
+def format_page(page):
+    """Display columns for a page of rows; the page itself is left untouched"""
+    return pd.DataFrame(
+        {
+            name: FORMATTERS[COLUMN_FORMATS[name]](page[name].to_numpy()) if name in COLUMN_FORMATS else page[name]
+            for name in page.columns
+        },
+        index=page.index
+    )
+
+def formatted_page(frame, rows, cache=None):
+    """The formatted rows of one page, reused from the cache when that page was shown before"""
+    key = rows.tobytes()
+    if cache is not None:
+        with cache["lock"]:
+            page = cache["pages"].get(key)
+            if page is not None:
+                cache["pages"].move_to_end(key)
+                return page
+    page = format_page(frame.take(rows))
+    if cache is not None:
+        with cache["lock"]:
+            cache["pages"][key] = page
+            while len(cache["pages"]) > PAGE_CACHE_SIZE:
+                cache["pages"].popitem(last=False)
+    return page
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# -----------------------
+# CONFIG
+# -----------------------
+# A ranking keeps exact per-key totals up to EXACT_LIMIT distinct keys; past
+# that it becomes a Space-Saving sketch of SKETCH_COUNTERS counters, so memory
+# stays bounded however many SKUs the data holds
+EXACT_LIMIT = int(os.getenv("SALES_TOPK_EXACT_LIMIT", "100000"))
+SKETCH_COUNTERS = int(os.getenv("SALES_TOPK_COUNTERS", "10000"))
+
+# -----------------------
+# SELECTION
+# -----------------------
+def heaviest(totals, k):
+    """The k largest totals, largest first and ties in key order, without sorting the rest"""
+    # nlargest is a partial selection; keep="all" holds every tie at the cut so
+    # the tie order does not depend on the order keys arrived in
+    candidates = totals.nlargest(k, keep="all")
+    order = np.lexsort((candidates.index.astype(str), -candidates.to_numpy()))
+    return candidates.iloc[order[:k]]
+
+# -----------------------
+# RANKINGS
+# -----------------------
+# A ranking is a dict holding "totals" (key -> total, a Series) and, once it is
+# a sketch, "errors" (how far each total may overstate the truth) and "floor"
+# (the most any key the sketch no longer tracks can have). Exact rankings have
+# errors None and floor 0. Rankings are never mutated; updates return a new one
+def _trim(totals, errors, floor, counters):
+    """Keep the heaviest counters; anything dropped is bounded by the largest dropped total"""
+    if len(totals) <= counters:
+        return totals, errors, floor
+    kept = heaviest(totals, counters + 1)
+    floor = max(floor, float(kept.iloc[-1]))
+    kept = kept.iloc[:-1]
+    return kept, errors.reindex(kept.index), floor
+
+def new_ranking(totals, exact_limit=EXACT_LIMIT, counters=SKETCH_COUNTERS):
+    """A ranking over exact per-key totals, sketched when there are too many keys"""
+    ranking = {"totals": totals, "errors": None, "floor": 0.0, "exact_limit": exact_limit, "counters": counters}
+    if len(totals) <= exact_limit:
+        return ranking
+    errors = pd.Series(0.0, index=totals.index)
+    ranking["totals"], ranking["errors"], ranking["floor"] = _trim(totals, errors, 0.0, counters)
+    return ranking
+
+def update_ranking(ranking, totals):
+    """A new ranking with a batch of exact per-key totals added"""
+    if ranking["errors"] is None:
+        return new_ranking(ranking["totals"].add(totals, fill_value=0), ranking["exact_limit"], ranking["counters"])
+    # Space-Saving charges a key it was not tracking the most it could already
+    # have, and records that charge as the key's error
+    floor = ranking["floor"]
+    keys = ranking["totals"].index.union(totals.index)
+    merged = ranking["totals"].reindex(keys, fill_value=floor) + totals.reindex(keys, fill_value=0)
+    errors = ranking["errors"].reindex(keys, fill_value=floor)
+    merged, errors, floor = _trim(merged, errors, floor, ranking["counters"])
+    return {**ranking, "totals": merged, "errors": errors, "floor": floor}
+
+def is_sketch(ranking):
+    """Whether the ranking's totals are Space-Saving estimates rather than exact"""
+    return ranking["errors"] is not None
+
+def top_keys(ranking, k):
+    """The k heaviest keys, heaviest first"""
+    return heaviest(ranking["totals"], k).index.tolist()
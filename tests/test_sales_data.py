@@ -0,0 +1,178 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import sales_data
+
+
+def test_generated_datasets_are_date_sorted_in_both_formats(tmp_path):
+    csv_path, store_path = str(tmp_path / "gen.csv"), str(tmp_path / "gen")
+    # Chunks that split days, and a row count that is not a multiple of them
+    sales_data.generate_sales_data(csv_path, 25_003, chunk_rows=1_000)
+    sales_data.generate_sales_data(store_path, 25_003, fmt="columnar", chunk_rows=1_000)
+    csv = pd.read_csv(csv_path, parse_dates=["Date"])
+    store = sales_data.store_to_frame(sales_data.open_columnar_dataset(store_path))
+    assert len(csv) == len(store) == 25_003
+    assert csv["Date"].is_monotonic_increasing
+    for name in sales_data.GENERATOR_COLUMNS:
+        assert np.array_equal(csv[name].to_numpy(), np.asarray(store[name].astype(csv[name].dtype))), name
+
+
+def test_columnar_dataset_is_a_sales_source(tmp_path):
+    csv_path, store_path = str(tmp_path / "gen.csv"), str(tmp_path / "gen")
+    sales_data.generate_sales_data(csv_path, 5_000, seed=1)
+    sales_data.generate_sales_data(store_path, 5_000, fmt="columnar", seed=1)
+    assert sales_data.is_columnar_dataset(store_path) and not sales_data.is_partitioned(store_path)
+    expected = sales_data.load_sales_data(csv_path)
+    frame = sales_data.load_sales_data(store_path)
+    assert frame["Revenue"].sum() == expected["Revenue"].sum()
+    assert frame["Product"].astype(str).tolist() == expected["Product"].astype(str).tolist()
+
+    state = sales_data.new_ingest_state()
+    first = sales_data.ingest_sales_data(store_path, state)["snapshot"]
+    assert first["rows"] == 5_000
+    assert sales_data.ingest_sales_data(store_path, state)["snapshot"] is first
+    sales_data.generate_sales_data(store_path, 6_000, fmt="columnar", seed=2)
+    assert sales_data.ingest_sales_data(store_path, state)["snapshot"]["rows"] == 6_000
+
+
+def test_prewarmed_partition_snapshot_follows_partition_changes(tmp_path):
+    root = tmp_path / "parts"
+    frame = sales_data.read_sales_csv(_generated_csv(tmp_path, 6_000))
+    for (year, month), rows in frame.groupby([frame["Date"].dt.year, frame["Date"].dt.month]):
+        if month <= 3:
+            (root / f"year={year}" / f"month={month:02d}").mkdir(parents=True)
+            rows.to_csv(root / f"year={year}" / f"month={month:02d}" / "sales.csv", index=False)
+    state = sales_data.new_partition_state()
+    warm = sales_data.prewarm_partition_snapshot(str(root), state)
+    index = sales_data.refresh_partition_index(str(root))
+    rel_paths = sales_data.select_partitions(index, *sales_data.partition_date_bounds(index))
+    signatures = sales_data.partition_signatures(index, rel_paths)
+    assert sales_data.prewarmed_partition_snapshot(state, rel_paths, signatures) is warm["snapshot"]
+    assert warm["snapshot"]["rows"] == sum(index["partitions"][p]["rows"] for p in rel_paths)
+    assert sales_data.prewarmed_partition_snapshot(state, rel_paths[1:], signatures[1:]) is None
+    assert sales_data.prewarm_partition_snapshot(str(root), state) is warm
+
+    extra = pd.read_csv(root / rel_paths[0]).iloc[:1].assign(Quantity=999)
+    extra.to_csv(root / rel_paths[0], mode="a", header=False, index=False)
+    assert sales_data.prewarm_partition_snapshot(str(root), state)["snapshot"]["rows"] == warm["snapshot"]["rows"] + 1
+
+
+def test_chunked_reads_drop_the_same_duplicates_as_a_whole_file_load(tmp_path):
+    path = _generated_csv(tmp_path, 20_000)
+    raw = pd.read_csv(path)
+    # Copies far from their originals, so they land in other chunks
+    pd.concat([raw, raw.iloc[::7], raw.iloc[:50]]).to_csv(path, index=False)
+    whole = sales_data.read_sales_csv(path)
+    chunks = list(sales_data.iter_sales_csv(path, chunksize=3_000))
+    assert len(chunks) > 1
+    streamed = sales_data.concat_sales_frames(chunks)
+    assert len(streamed) == len(whole) == len(raw.drop_duplicates())
+    rows = lambda frame: sorted(map(tuple, frame.astype(str).to_numpy().tolist()))
+    assert rows(streamed) == rows(whole)
+
+
+def test_appended_rows_that_only_share_a_hash_are_kept(tmp_path, monkeypatch):
+    path = _generated_csv(tmp_path, 2_000)
+    state = sales_data.new_ingest_state()
+    sales_data.ingest_sales_data(path, state)
+    with open(path, "rb") as f:
+        last = f.read().rstrip(b"\n").rsplit(b"\n", 1)[1]
+    # Every row hashes alike: only a row equal to a loaded one may be dropped
+    monkeypatch.setattr(sales_data, "row_hashes", lambda df: np.zeros(len(df), dtype=np.uint64))
+    fresh = last.rsplit(b",", 1)[0] + b",Nobody"
+    with open(path, "ab") as f:
+        f.write(last + b"\n" + fresh + b"\n")
+    snapshot = sales_data.ingest_sales_data(path, state)["snapshot"]
+    assert snapshot["rows"] == 2_001
+    assert state["appends"] == 1
+
+
+def test_appends_grow_the_store_files_in_place(tmp_path):
+    path = _generated_csv(tmp_path, 3_000)
+    state = sales_data.new_ingest_state()
+    sales_data.ingest_sales_data(path, state)
+    data_dir = state["store"]["data_dir"]
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "ab") as f:
+        f.write(_late_row(data) + _late_row(data).replace(b",7,", b",8,"))
+    frame = sales_data.ingest_sales_data(path, state)["snapshot"]["frame"]
+    assert state["appends"] == 1 and state["store"]["data_dir"] == data_dir
+
+    # Each file's header was rewritten to the grown row count, and a fresh
+    # load of the files sees what a plain pandas parse of the CSV sees
+    cache_dir = sales_data.cache_dir_for(path)
+    meta = sales_data.load_cache_meta(cache_dir)
+    for entry in meta["columns"]:
+        values = np.load(os.path.join(cache_dir, data_dir, entry["file"]), allow_pickle=False)
+        assert values.shape == (len(frame),) == (meta["rows"],), entry["name"]
+    expected = sales_data.sort_by_date(sales_data.read_sales_csv(path)).reset_index(drop=True)
+    reloaded = sales_data.load_sales_data(path)
+    for name in expected.columns:
+        for actual in (frame, reloaded):
+            assert actual[name].astype(str).tolist() == expected[name].astype(str).tolist(), name
+
+
+def test_same_size_rewrite_is_reloaded_and_then_appended_to(tmp_path):
+    path = _generated_csv(tmp_path, 3_000)
+    state = sales_data.new_ingest_state()
+    sales_data.ingest_sales_data(path, state)
+    with open(path, "rb") as f:
+        data = f.read()
+    # Swap two equal-length region names in the middle of the file, outside the hashed windows
+    middle = len(data) // 2
+    rewritten = data[:middle] + data[middle:].replace(b",North,", b",South,", 1)
+    assert len(rewritten) == len(data) and rewritten != data
+    with open(path, "r+b") as f:
+        f.write(rewritten)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    frame = sales_data.ingest_sales_data(path, state)["snapshot"]["frame"]
+    assert state["full_loads"] == 2
+    assert _region_revenue(frame).equals(_region_revenue(sales_data.read_sales_csv(path)))
+
+    with open(path, "ab") as f:
+        f.write(_late_row(data))
+    frame = sales_data.ingest_sales_data(path, state)["snapshot"]["frame"]
+    assert state["appends"] == 1
+    assert _region_revenue(frame).equals(_region_revenue(sales_data.read_sales_csv(path)))
+
+
+def test_store_appended_by_another_process_is_mapped_not_copied(tmp_path):
+    path = _generated_csv(tmp_path, 3_000)
+    ours, theirs = sales_data.new_ingest_state(), sales_data.new_ingest_state()
+    sales_data.ingest_sales_data(path, ours)
+    sales_data.ingest_sales_data(path, theirs)
+    with open(path, "rb") as f:
+        data = f.read()
+    # The other process catches up with two appends before this one looks
+    for rep in (b"Late Rep", b"Later Rep"):
+        with open(path, "ab") as f:
+            f.write(_late_row(data).replace(b"Late Rep", rep))
+        sales_data.ingest_sales_data(path, theirs)
+    assert theirs["appends"] == 2 and theirs["full_loads"] == 1
+
+    sales_data.ingest_sales_data(path, ours)
+    assert ours["appends"] == 1 and ours["full_loads"] == 1
+    assert ours["store"]["data_dir"] == theirs["store"]["data_dir"]
+    assert ours["offset"] == theirs["offset"] == os.path.getsize(path)
+    frame = ours["snapshot"]["frame"]
+    pd.testing.assert_frame_equal(frame, theirs["snapshot"]["frame"])
+    assert _region_revenue(frame).equals(_region_revenue(sales_data.read_sales_csv(path)))
+
+
+def _generated_csv(tmp_path, rows):
+    path = str(tmp_path / "generated.csv")
+    sales_data.generate_sales_data(path, rows, seed=4)
+    return path
+
+
+def _late_row(data):
+    """A new row dated like the last row of a CSV's bytes"""
+    last = data.rstrip(b"\n").rsplit(b"\n", 1)[1].split(b",")
+    return b",".join(last[:3] + [b"7"] + last[4:7] + [b"Late Rep"]) + b"\n"
+
+
+def _region_revenue(frame):
+    return frame.groupby(frame["Region"].astype(str))["Revenue"].sum().round(2)
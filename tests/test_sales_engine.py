@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sales_data
+import sales_engine
+import sales_topk
+
+
+@pytest.fixture(scope="module")
+def sales_frame(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("engine") / "sales.csv")
+    sales_data.generate_sales_data(path, 150_000, n_products=60, seed=3)
+    return sales_data.sort_by_date(sales_data.read_sales_csv(path))
+
+
+@pytest.fixture(scope="module")
+def derived_snapshot(sales_frame):
+    ranking = sales_topk.new_ranking(sales_data.product_revenue_totals(sales_frame))
+    return sales_data.build_snapshot(sales_frame, ranking, None, sales_engine.derive_snapshot)
+
+
+def test_progressive_aggregates_stops_before_overrunning_the_budget(sales_frame):
+    sample = sales_engine.build_stratified_sample(sales_frame, len(sales_frame))
+    assert len(sales_engine.approximate_levels(sample)) > 1
+    # The first estimate is always made; no larger one fits in no time at all
+    estimates = list(sales_engine.progressive_aggregates(sample, target=0.0, budget_ms=0))
+    assert [a["sampled_rows"] for a in estimates] == [estimates[0]["sampled_rows"]]
+    estimates = list(sales_engine.progressive_aggregates(sample, target=0.0, budget_ms=60_000))
+    assert len(estimates) == len(sales_engine.approximate_levels(sample))
+
+
+def test_prewarmed_stream_partials_match_a_fresh_pass(tmp_path):
+    path = str(tmp_path / "sales.csv")
+    sales_data.generate_sales_data(path, 20_000, n_products=40, seed=5)
+    state = sales_engine.new_stream_state()
+    signature = sales_data.source_signature(path)
+    sales_engine.prewarm_stream_partials(path, state, signature, memory_budget_mb=1)
+    summary = sales_engine.prewarmed_stream_partials(state, signature, None)
+    filters = sales_engine.default_stream_filters(summary)
+    for selection in (None, filters):
+        warm = sales_engine.finalize_aggregates(sales_engine.prewarmed_stream_partials(state, signature, selection))
+        fresh = sales_engine.finalize_aggregates(sales_engine.stream_partials(path, selection))
+        assert warm["total_revenue"] == fresh["total_revenue"]
+        pd.testing.assert_frame_equal(warm["top_products"], fresh["top_products"])
+    assert sales_engine.prewarmed_stream_partials(state, signature, {**filters, "regions": filters["regions"][:1]}) is None
+    assert sales_engine.prewarmed_stream_partials(state, (0, 0), None) is None
+
+
+def test_toggled_filters_are_patched_to_the_plain_pandas_result(derived_snapshot):
+    frame = derived_snapshot["frame"]
+    filters = derived_snapshot["default_filters"]
+    session = {}
+    regions, categories = filters["regions"], filters["categories"]
+    steps = [
+        {**filters, "regions": regions[1:]},
+        {**filters, "regions": regions[2:]},
+        {**filters, "regions": regions},
+        {**filters, "categories": categories[:-1]},
+        {**filters, "categories": categories[:-1], "start_date": frame["Date"].iloc[len(frame) // 3].date()}
+    ]
+    depths = []
+    for step in steps:
+        partials = sales_engine.snapshot_partials(derived_snapshot, step, session)
+        depths.append(session["delta_base"]["depth"])
+        _assert_same_aggregates(
+            sales_engine.finalize_aggregates(partials, step["granularity"]),
+            sales_engine.finalize_aggregates(sales_engine.partial_aggregates(sales_engine.apply_filters(frame, step)), step["granularity"])
+        )
+    # Every toggle is patched; only the date change is recomputed
+    assert depths == [1, 2, 3, 4, 0]
+
+
+def _assert_same_aggregates(actual, expected):
+    assert actual["total_orders"] == expected["total_orders"]
+    assert actual["total_quantity"] == expected["total_quantity"]
+    assert actual["total_revenue"] == pytest.approx(expected["total_revenue"])
+    for key in ("category", "region", "region_quantity", "trend", "weekday"):
+        pd.testing.assert_frame_equal(
+            actual[key].reset_index(drop=True), expected[key].reset_index(drop=True), check_dtype=False, check_categorical=False
+        )
+    assert np.allclose(actual["top_products"]["Revenue"], expected["top_products"]["Revenue"])
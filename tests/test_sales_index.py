@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sales_index
+
+
+def _frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Skewed labels, so some bitmaps get dense containers and others stay sparse
+    products = np.array([f"P{i}" for i in range(300)] + [None], dtype=object)
+    return pd.DataFrame({
+        "Region": pd.Categorical(rng.choice(["North", "South", "East", "West"], n, p=[0.7, 0.1, 0.1, 0.1])),
+        "Category": pd.Categorical(rng.choice(["Books", "Sports"], n), categories=["Books", "Garden", "Sports"]),
+        "Product": products[np.minimum(rng.zipf(1.3, n) - 1, len(products) - 1)]
+    })
+
+
+@pytest.mark.parametrize("first_row", [0, 70_000])
+def test_build_bitmap_indexes_matches_label_masks(first_row):
+    frame = _frame(200_000)
+    indexes = sales_index.build_bitmap_indexes(frame, first_row=first_row)
+    for name in sales_index.INDEXED_DIMENSIONS:
+        column = frame[name].astype("category")
+        codes = column.cat.codes.to_numpy()
+        labels = [str(label) for label in column.cat.categories]
+        assert list(indexes[name]) == [labels[code] for code in np.unique(codes[codes >= 0])]
+        for code in np.unique(codes[codes >= 0]):
+            bitmap = indexes[name][labels[code]]
+            assert list(bitmap) == sorted(bitmap)
+            expected = np.flatnonzero(codes == code) + first_row
+            assert np.array_equal(sales_index.bitmap_to_rows(bitmap), expected), (name, labels[code])
+
+
+def _rows(rng, n, universe):
+    # A mix of sparse and dense containers, across several container keys
+    dense = rng.integers(0, universe // 2, n)
+    sparse = rng.integers(universe // 2, universe, n // 50)
+    return np.unique(np.concatenate([dense, sparse]))
+
+
+def test_bitmap_operations_match_numpy_set_operations():
+    rng = np.random.default_rng(1)
+    universe = 5 * sales_index.CONTAINER_ROWS
+    sets = [_rows(rng, n, universe) for n in (150_000, 40_000, 3_000)]
+    bitmaps = [sales_index.bitmap_from_rows(rows) for rows in sets]
+    for rows, bitmap in zip(sets, bitmaps):
+        assert np.array_equal(sales_index.bitmap_to_rows(bitmap), rows)
+    union = sales_index.bitmap_to_rows(sales_index.bitmap_union(bitmaps))
+    assert np.array_equal(union, np.unique(np.concatenate(sets)))
+    for pair in ([0, 1], [1, 2], [0, 2]):
+        both = sales_index.bitmap_to_rows(sales_index.bitmap_intersection([bitmaps[i] for i in pair]))
+        assert np.array_equal(both, np.intersect1d(sets[pair[0]], sets[pair[1]]))
+    for stop in (0, 1, sales_index.CONTAINER_ROWS, 2 * sales_index.CONTAINER_ROWS + 123, universe):
+        truncated = sales_index.bitmap_to_rows(sales_index.truncate_bitmap(bitmaps[0], stop))
+        assert np.array_equal(truncated, sets[0][sets[0] < stop])
+
+
+@pytest.mark.parametrize("start", [0, 65_000, 131_072, 150_000])
+def test_extended_bitmap_indexes_match_a_fresh_build(start):
+    frame = _frame(200_000, seed=2)
+    old = sales_index.build_bitmap_indexes(frame.iloc[:start])
+    # Index other rows past start first; extending from start must drop them
+    old = sales_index.extend_bitmap_indexes(old, pd.concat([frame.iloc[:start], _frame(1_000, seed=4)]), start)
+    old = sales_index.extend_bitmap_indexes(old, frame, start)
+    fresh = sales_index.build_bitmap_indexes(frame)
+    for name in sales_index.INDEXED_DIMENSIONS:
+        assert set(old[name]) == set(fresh[name])
+        for label, bitmap in fresh[name].items():
+            assert np.array_equal(sales_index.bitmap_to_rows(old[name][label]), sales_index.bitmap_to_rows(bitmap)), label
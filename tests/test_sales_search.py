@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import sales_data
+import sales_engine
+import sales_search
+import sales_topk
+
+
+@pytest.fixture(scope="module")
+def derived_snapshot(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("search") / "sales.csv")
+    sales_data.generate_sales_data(path, 40_000, n_products=80, seed=6)
+    frame = sales_data.sort_by_date(sales_data.read_sales_csv(path))
+    ranking = sales_topk.new_ranking(sales_data.product_revenue_totals(frame))
+    return sales_data.build_snapshot(frame, ranking, None, sales_engine.derive_snapshot)
+
+
+@pytest.mark.parametrize("needle", ["phon", "PHON", "rth", "2024-09", "-0", "e", "50", "no such text"])
+def test_substring_search_matches_str_contains(derived_snapshot, needle):
+    frame = derived_snapshot["frame"]
+    expected = np.flatnonzero(
+        frame.astype(str).apply(lambda x: x.str.contains(needle, case=False, regex=False)).any(axis=1).to_numpy()
+    )
+    actual = sales_search.search_rows(
+        derived_snapshot["search_index"], needle, {}, derived_snapshot["date_index"], derived_snapshot["bitmaps"]
+    )
+    assert np.array_equal(actual, expected)
+
+
+def test_filtered_search_matches_str_contains_over_the_filtered_rows(derived_snapshot):
+    frame = derived_snapshot["frame"]
+    filters = {
+        **derived_snapshot["default_filters"],
+        "regions": derived_snapshot["default_filters"]["regions"][:2],
+        "start_date": frame["Date"].iloc[len(frame) // 4].date()
+    }
+    selected = (
+        frame["Region"].isin(filters["regions"]) & frame["Category"].isin(filters["categories"])
+        & frame["Product"].isin(filters["products"]) & (frame["Date"].dt.date >= filters["start_date"])
+    ).to_numpy()
+    hits = frame["Product"].astype(str).str.contains("o", case=False, regex=False).to_numpy()
+    actual = sales_search.search_rows(
+        derived_snapshot["search_index"], "product:o", filters, derived_snapshot["date_index"], derived_snapshot["bitmaps"]
+    )
+    assert np.array_equal(actual, np.flatnonzero(selected & hits))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+import sales_table
+
+
+def test_format_page_with_no_rows():
+    frame = pd.DataFrame({
+        "Date": pd.to_datetime(["2024-01-02"]),
+        "Product": ["Tablet"],
+        "Quantity": np.array([3], dtype=np.int16),
+        "Unit_Price": [1250.5],
+        "Revenue": [3751.5]
+    })
+    page = sales_table.formatted_page(frame, np.array([], dtype=np.int64))
+    assert len(page) == 0
+    assert list(page.columns) == list(frame.columns)
+
+
+def test_indian_grouping():
+    assert list(sales_table.format_number([0, 999, 1000, 1234567, -12345678])) == [
+        "0", "999", "1,000", "12,34,567", "-1,23,45,678"
+    ]
+    assert list(sales_table.format_rupees([1234567.5, np.nan])) == ["₹12,34,567.50", ""]
+
+
+def test_sort_order_matches_pandas_with_missing_values_last():
+    rng = np.random.default_rng(0)
+    n = 500
+    labels = np.array(["North", "South", "East", "West", None], dtype=object)[rng.integers(0, 5, n)]
+    prices = rng.integers(0, 50, n).astype(float)
+    prices[rng.random(n) < 0.1] = np.nan
+    dates = pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 30, n), unit="D")
+    frame = pd.DataFrame({
+        # Categories listed out of label order, so codes do not sort like labels
+        "Region": pd.Categorical(labels, categories=["West", "North", "South", "East"]),
+        "Sales_Rep": labels,
+        "Unit_Price": prices,
+        "Date": dates.where(rng.random(n) > 0.1),
+        "Quantity": rng.integers(1, 10, n).astype(np.int16)
+    })
+    for column in frame.columns:
+        for descending in (False, True):
+            values = frame[column].astype(str).where(frame[column].notna()) if column == "Region" else frame[column]
+            expected = values.sort_values(ascending=not descending, kind="stable", na_position="last").index
+            order = sales_table.sort_order(frame, column, descending)
+            got = np.arange(n) if order is None else order
+            assert np.array_equal(got, expected.to_numpy()), (column, descending)
+
+
+def test_sort_order_recognises_sorted_frames():
+    frame = pd.DataFrame({"Region": pd.Categorical(["b", "a"], categories=["b", "a"]), "Quantity": [1, 2]})
+    assert sales_table.sort_order(frame, "Quantity") is None
+    assert np.array_equal(sales_table.sort_order(frame, "Region"), [1, 0])